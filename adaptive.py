@@ -0,0 +1,72 @@
+from typing import Dict, List, Tuple
+from math import ceil
+from racing import recorded_objectives
+from to_json import Method
+
+
+class AdaptiveRepetitions:
+    # each (asset type, instance) pair is run min_runs times, and then again
+    # while the confidence interval of its mean objective is wider (relative
+    # to the mean) than the threshold, up to max_runs times:
+    runners: List = None
+    data_files: List[str] = None
+    min_runs: int = 3
+    max_runs: int = 10
+    threshold: float = 0.01
+    confidence: float = 0.95
+    # (runner output path, data file) -> the runs recorded before the first
+    # tasks and the runs scheduled since; a run that records nothing (e.g.
+    # the solver printed nothing) still counts as an attempt, so that no
+    # pair is attempted more than max_runs times:
+    attempts: Dict[Tuple[str, str], int] = None
+
+    def __init__(self, runners: List, data_files: List[str], min_runs: int,
+                 max_runs: int, threshold: float = 0.01,
+                 confidence: float = 0.95):
+        self.runners = runners
+        self.data_files = data_files
+        self.max_runs = max(1, max_runs)
+        self.min_runs = max(2, min(min_runs, self.max_runs))
+        self.threshold = threshold
+        self.confidence = confidence
+        self.attempts = dict()
+
+    def target(self, method: Method) -> int:
+        # the number of runs that is expected to narrow the confidence
+        # interval to the threshold (its width shrinks with the square root of
+        # the number of runs); runs without an objective are repeated up to
+        # the maximum:
+        num_runs = len(method.runs)
+        if num_runs < self.min_runs:
+            return self.min_runs
+        width = method.relative_width(self.confidence)
+        if width is None:
+            return self.max_runs
+        if width <= self.threshold:
+            return num_runs
+        return min(self.max_runs,
+                   max(num_runs + 1,
+                       ceil(num_runs * (width / self.threshold) ** 2)))
+
+    def tasks(self) -> List:
+        tasks = []
+        for mr in self.runners:
+            objectives = recorded_objectives(mr)
+            for df in self.data_files:
+                method = Method(mr.output_path, None)
+                for o, _ in objectives.get(mr.file_name(df), []):
+                    method.append_run(o, None, False)
+                # the recorded runs include the budget runs that were stopped
+                # by the time limit, which are not counted:
+                recorded = mr.index.count(mr.file_name(df))
+                attempts = self.attempts.setdefault((mr.output_path, df),
+                                                    recorded)
+                num_tasks = min(self.target(method) - len(method.runs),
+                                self.max_runs - attempts)
+                self.attempts[(mr.output_path, df)] += max(0, num_tasks)
+                tasks += [(mr, df, recorded + k) for k in range(num_tasks)]
+        return tasks
+
+    def num_recorded(self) -> int:
+        return sum(mr.index.count(mr.file_name(df))
+                   for mr in self.runners for df in self.data_files)
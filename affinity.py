@@ -0,0 +1,94 @@
+from typing import List, Set, Tuple, Union
+import logging
+from os import path
+from shutil import which
+import os
+import asyncio
+
+
+def parse_cpu_list(cpu_list: str) -> List[int]:
+    # parses lists such as '0-3,8,10-11':
+    cpus = []
+    for part in cpu_list.strip().split(','):
+        part = part.strip()
+        if len(part) == 0:
+            continue
+        if '-' in part:
+            first, last = part.split('-')
+            cpus.extend(range(int(first), int(last) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def available_cpus() -> Set[int]:
+    if hasattr(os, 'sched_getaffinity'):
+        return set(os.sched_getaffinity(0))
+    return set(range(os.cpu_count() or 1))
+
+
+def numa_cpus(node: int) -> Set[int]:
+    cpu_list = f'/sys/devices/system/node/node{node}/cpulist'
+    if not path.isfile(cpu_list):
+        raise ValueError(f'NUMA node {node} does not exist.')
+    with open(cpu_list, 'r') as f:
+        return set(parse_cpu_list(f.read()))
+
+
+def core_id(cpu: int) -> Tuple[int, int]:
+    # (package, core) of a logical cpu; hyperthreads share the same pair:
+    topology = f'/sys/devices/system/cpu/cpu{cpu}/topology'
+    try:
+        with open(path.join(topology, 'physical_package_id'), 'r') as f:
+            package = int(f.read())
+        with open(path.join(topology, 'core_id'), 'r') as f:
+            core = int(f.read())
+        return package, core
+    except (OSError, ValueError):
+        return -1, cpu
+
+
+def physical_cores(cpus: Union[None, Set[int]] = None) -> List[int]:
+    # one logical cpu per physical core amongst the given cpus:
+    if cpus is None:
+        cpus = available_cpus()
+    seen = set()
+    cores = []
+    for cpu in sorted(cpus):
+        cid = core_id(cpu)
+        if cid in seen:
+            continue
+        seen.add(cid)
+        cores.append(cpu)
+    return cores
+
+
+def pin(cpu: int) -> List[str]:
+    # the command prefix that pins the command to the cpu before it executes,
+    # so that minizinc, the solver it starts, and all of their threads
+    # inherit the affinity:
+    taskset = which('taskset')
+    if taskset is None:
+        logging.warning(f'taskset not found: not pinning to cpu {cpu}.')
+        return []
+    return [taskset, '-c', str(cpu)]
+
+
+class CorePool:
+    cores: List[int] = None
+    queue: asyncio.Queue = None
+
+    def __init__(self, cores: List[int]):
+        self.cores = list(cores)
+        self.queue = asyncio.Queue()
+        for core in self.cores:
+            self.queue.put_nowait(core)
+
+    def __len__(self):
+        return len(self.cores)
+
+    async def acquire(self) -> int:
+        return await self.queue.get()
+
+    def release(self, core: int) -> None:
+        self.queue.put_nowait(core)
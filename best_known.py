@@ -0,0 +1,194 @@
+import logging
+from typing import Dict, Union
+from argparse import ArgumentParser
+from glob import glob
+from os import path, replace
+import json
+from to_json import parse_extras, reached_time_limit
+
+
+class BestKnown:
+    # the best known objective of an instance and the best proven bound on
+    # its optimum (equal once the optimum is known), and where they are from:
+    objective: Union[None, int] = None
+    bound: Union[None, int] = None
+    source: Union[None, str] = None
+    maximise: bool = False
+
+    def __init__(self, objective: Union[None, int] = None,
+                 bound: Union[None, int] = None,
+                 source: Union[None, str] = None, maximise: bool = False):
+        self.objective = objective
+        self.bound = bound
+        self.source = source
+        self.maximise = maximise
+
+    def better(self, a: int, b: Union[None, int]) -> bool:
+        return b is None or (a > b if self.maximise else a < b)
+
+    def is_optimal(self, objective: Union[None, int]) -> bool:
+        # an objective that reaches the bound is optimal:
+        return (objective is not None and self.bound is not None and
+                not self.better(self.bound, objective))
+
+    def to_dict(self) -> Dict[str, Union[int, str, bool]]:
+        d = dict()
+        for key in ('objective', 'bound', 'source'):
+            if getattr(self, key) is not None:
+                d[key] = getattr(self, key)
+        if self.maximise:
+            d['maximise'] = True
+        return d
+
+
+class Registry:
+    # instance -> best known objective and bound, kept in a JSON file:
+    # {"<instance>": {"objective": 930, "bound": 930, "source": "..."}}
+    registry_path: str = None
+    entries: Dict[str, BestKnown] = None
+
+    def __init__(self, registry_path: str):
+        self.registry_path = registry_path
+        self.entries = dict()
+        if path.isfile(registry_path):
+            with open(registry_path, 'r') as registry_file:
+                for instance, d in json.load(registry_file).items():
+                    self.entries[instance] = BestKnown(
+                        d.get('objective'), d.get('bound'), d.get('source'),
+                        bool(d.get('maximise', False)))
+
+    def get(self, instance: str) -> Union[None, BestKnown]:
+        return self.entries.get(instance)
+
+    def objective(self, instance: str) -> Union[None, int]:
+        entry = self.get(instance)
+        return None if entry is None else entry.objective
+
+    def is_optimal(self, instance: str, objective: Union[None, int]) -> bool:
+        entry = self.get(instance)
+        return entry is not None and entry.is_optimal(objective)
+
+    def update(self, instance: str, objective: Union[None, int] = None,
+               bound: Union[None, int] = None,
+               source: Union[None, str] = None,
+               maximise: Union[None, bool] = None) -> bool:
+        # keeps the better objective and the tighter bound; returns True if
+        # the entry changed:
+        entry = self.entries.setdefault(instance, BestKnown())
+        if maximise is not None:
+            entry.maximise = maximise
+        changed = False
+        if objective is not None and entry.better(objective,
+                                                  entry.objective):
+            entry.objective = objective
+            changed = True
+        if bound is not None and (entry.bound is None or
+                                  entry.better(entry.bound, bound)):
+            entry.bound = bound
+            changed = True
+        if changed and source is not None:
+            entry.source = source
+        return changed
+
+    def seed(self, output_path: str, time_limit: int) -> int:
+        # the best objective of every instance in a result file; a run that
+        # ended before the time limit without an error proved its objective
+        # optimal. Returns the number of updated instances:
+        updated = set()
+        source = path.basename(output_path)
+        with open(output_path, 'r') as output_file:
+            for line in output_file:
+                entries = [e.strip() for e in line.split('\t')]
+                if len(entries) < 5:
+                    continue
+                try:
+                    objective = int(entries[1])
+                    time = int(entries[2])
+                except ValueError:
+                    continue
+                try:
+                    initial_objective = int(entries[4])
+                except ValueError:
+                    initial_objective = None
+                extras = parse_extras(entries[6:])
+                if reached_time_limit(extras):
+                    continue
+                # runs with a deterministic budget also stop early:
+                proven = (time < time_limit and entries[3] == 'false' and
+                          'budget' not in extras and
+                          'memout' not in extras)
+                maximise = (None if initial_objective is None or
+                            objective == initial_objective
+                            else objective > initial_objective)
+                if self.update(entries[0], objective,
+                               objective if proven else None, source,
+                               maximise):
+                    updated.add(entries[0])
+        return len(updated)
+
+    def save(self) -> None:
+        tmp_path = self.registry_path + '.tmp'
+        with open(tmp_path, 'w') as registry_file:
+            json.dump({i: e.to_dict() for i, e in
+                       sorted(self.entries.items())}, registry_file,
+                      indent=2)
+        replace(tmp_path, self.registry_path)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+
+    parser.add_argument('--registry', dest='registry',
+                        metavar='<registry>.json', type=str, required=True,
+                        help='the best known objective and bound registry.')
+
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    seed_parser = subparsers.add_parser(
+        'seed', help='add the best objectives of results/<model>.txt-* '
+        'files to the registry.')
+    seed_parser.add_argument(dest='data_files',
+                             metavar='<data file>.txt[-*]', nargs='+',
+                             type=str, help='txt result files.')
+    seed_parser.add_argument('--time-limit', dest='time_limit', type=int,
+                             default=180000,
+                             help='the time limit of the runs; runs that '
+                             'ended earlier proved their objective optimal.')
+
+    set_parser = subparsers.add_parser(
+        'set', help='add a best known objective or bound, e.g. from the '
+        'literature.')
+    set_parser.add_argument(dest='instance', type=str,
+                            help='the instance name.')
+    set_parser.add_argument('--objective', dest='objective', type=int,
+                            default=None)
+    set_parser.add_argument('--bound', dest='bound', type=int, default=None)
+    set_parser.add_argument('--source', dest='source', type=str,
+                            default=None, help='e.g. a citation.')
+    set_parser.add_argument('--maximise', dest='maximise', default=None,
+                            action='store_true')
+
+    subparsers.add_parser('show', help='print the registry.')
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    registry = Registry(args.registry)
+
+    if args.command == 'seed':
+        data_files = sorted({fp for glob_list in args.data_files
+                             for fp in glob(glob_list)})
+        for data_file in data_files:
+            num_updated = registry.seed(data_file, args.time_limit)
+            logging.info(f'{path.basename(data_file)}: updated '
+                         f'{num_updated} instances')
+        registry.save()
+    elif args.command == 'set':
+        registry.update(args.instance, args.objective, args.bound,
+                        args.source, args.maximise)
+        registry.save()
+    elif args.command == 'show':
+        for instance, entry in sorted(registry.entries.items()):
+            print('\t'.join([instance] + [f'{k}={v}' for k, v in
+                                          entry.to_dict().items()]))
@@ -0,0 +1,125 @@
+import logging
+from typing import Dict, List, Tuple, Union
+from argparse import ArgumentParser
+from glob import glob
+from os import path
+from statistics import median
+import json
+from to_json import parse_extras
+
+# the kinds of deterministic budgets and the statistic (recorded with
+# run.py --statistics) each is calibrated from:
+budget_statistics = {'fail': 'failures', 'node': 'nodes'}
+
+Budget = Tuple[str, int]
+
+
+def load_budget(budget_path: str) -> Dict[str, Budget]:
+    # {"<instance>": {"fail": <limit>}, ...} -> instance -> (kind, limit):
+    with open(budget_path, 'r') as budget_file:
+        entries = json.load(budget_file)
+    budget = dict()
+    for instance, limits in entries.items():
+        kinds = [k for k in budget_statistics if k in limits]
+        if len(kinds) != 1:
+            raise ValueError(f'{budget_path}: {instance} must have exactly one '
+                             'of ' + ', '.join(budget_statistics) + '.')
+        budget[instance] = (kinds[0], int(limits[kinds[0]]))
+    return budget
+
+
+def format_budget(budget: Budget) -> str:
+    return f'{budget[0]}:{budget[1]}'
+
+
+def parse_budget(value: str) -> Budget:
+    kind, limit = value.split(':')
+    return kind, int(limit)
+
+
+def make_budget(output_paths: List[str], kind: str, scale: float = 1.0,
+                store=None, models: Union[None, List[str]] = None
+                ) -> Dict[str, Dict[str, int]]:
+    # the budget of an instance is the median number of failures (or nodes)
+    # of its runs on the reference machine, read from the result files or
+    # from the models (patterns) of a ResultStore:
+    statistic = budget_statistics[kind]
+    values: Dict[str, List[float]] = dict()
+    if store is not None:
+        for model in store.models(models):
+            for (_, _, instance, _, _, _, _,
+                 extras) in store.runs(model):
+                try:
+                    values.setdefault(instance, []).append(
+                        float(json.loads(extras)[statistic]))
+                except (KeyError, TypeError, ValueError):
+                    continue
+    for output_path in output_paths:
+        with open(output_path, 'r') as output_file:
+            for line in output_file:
+                entries = line.strip().split('\t')
+                extras = parse_extras(entries[6:])
+                try:
+                    values.setdefault(entries[0], []).append(
+                        float(extras[statistic]))
+                except (KeyError, ValueError):
+                    continue
+    return {instance: {kind: max(1, int(round(scale * median(vs))))}
+            for instance, vs in sorted(values.items()) if len(vs) > 0}
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+
+    parser.add_argument(dest='data_files', metavar='<data file>.txt[-*]',
+                        nargs='*', type=str,
+                        help='txt result files of runs with --statistics on '
+                        'the reference machine.')
+
+    parser.add_argument('--db', dest='db', metavar='<results>.sqlite',
+                        type=str, default=None,
+                        help='read the reference runs from this SQLite '
+                        'result store as well.')
+
+    parser.add_argument('--db-models', dest='db_models', nargs='*',
+                        type=str, default=None, metavar='<model pattern>',
+                        help='the models (e.g. jobshop*) to read from the '
+                        'result store; defaults to all.')
+
+    parser.add_argument('--kind', dest='kind', type=str, default='fail',
+                        choices=list(budget_statistics),
+                        help='limit the number of failures or nodes.')
+
+    parser.add_argument('--scale', dest='scale', type=float, default=1.0,
+                        help='the factor the median of the reference runs is '
+                        'multiplied by.')
+
+    parser.add_argument('-o', '--output', dest='output', required=True,
+                        metavar='<budget>.json', type=str,
+                        help='the budget file for run.py --budget.')
+
+    args = parser.parse_args()
+
+    if len(args.data_files) == 0 and args.db is None:
+        parser.error('give txt result files or --db.')
+
+    logging.basicConfig(level=logging.INFO)
+
+    data_files = sorted({fp for glob_list in args.data_files
+                         for fp in glob(glob_list)})
+
+    store = None
+    if args.db is not None:
+        from result_store import ResultStore
+        store = ResultStore(args.db)
+
+    budget = make_budget(data_files, args.kind, args.scale, store,
+                         args.db_models)
+    if len(budget) == 0:
+        logging.error('No runs with statistics; run the reference runs with '
+                      'run.py --statistics.')
+        exit(1)
+
+    with open(args.output, 'w') as budget_file:
+        json.dump(budget, budget_file, indent=2)
+    logging.info(f'{path.basename(args.output)}: {len(budget)} instances')
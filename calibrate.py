@@ -0,0 +1,163 @@
+import logging
+from typing import Dict, List, Tuple, Union
+from os import path
+from shutil import which
+from statistics import mean
+from time import perf_counter
+from affinity import CorePool
+from orchestrator import Orchestrator
+from solver_arguments import (minizinc_arguments, objective_re,
+                              search_limit_flags)
+
+base_dir = path.dirname(path.abspath(__file__))
+
+# (model, data file) pairs that are solved with a fixed seed and node limit,
+# so that every run performs the same search:
+calibration_workload = [
+    ('jobshop/jobshop.mzn', 'jobshop/job/jobshop_orb01-dl-10.dzn'),
+    ('tsptw/tsptw.mzn', 'tsptw/tsptw/n100w120.001.dzn'),
+]
+
+
+class CalibrationRun:
+    instance: str = None
+    duration: float = None
+    objective: Union[None, str] = None
+
+    def __init__(self, instance: str, duration: float,
+                 objective: Union[None, str]):
+        self.instance = instance
+        self.duration = duration
+        self.objective = objective
+
+
+class Calibration:
+    solver: str = None
+    extra: List[str] = []
+    cores: List[int] = []
+    pin_cores: bool = True
+    # the slowdown (relative to running alone) that is tolerated:
+    tolerance: float = 0.05
+    # level -> the runs and the wall time of the level:
+    levels: Dict[int, Tuple[List[CalibrationRun], float]] = None
+
+    def __init__(self, solver: str, cores: List[int], pin_cores: bool = True,
+                 node_limit: int = 200000, seed: int = 1,
+                 tolerance: float = 0.05, extra: List[str] = []):
+        self.solver = solver
+        self.cores = list(cores)
+        self.pin_cores = pin_cores
+        self.tolerance = tolerance
+        self.extra = (['-a', '--pbs-asset-type', '1'] +
+                      search_limit_flags(node_limit=node_limit, seed=seed) +
+                      extra)
+        self.levels = dict()
+
+    def arguments(self, model: str, data_file: str) -> List[str]:
+        return minizinc_arguments(which('minizinc'),
+                                  path.join(base_dir, model), self.solver,
+                                  path.join(base_dir, data_file),
+                                  flags=self.extra)
+
+    async def run(self, orchestrator: Orchestrator,
+                  core_pool: Union[None, CorePool], model: str,
+                  data_file: str, runs: List[CalibrationRun]) -> None:
+        lines = []
+        core = None if core_pool is None else await core_pool.acquire()
+        start = perf_counter()
+        try:
+            result = await orchestrator.run(
+                self.arguments(model, data_file), lines.append, core=core)
+        finally:
+            if core is not None:
+                core_pool.release(core)
+        if not result.finished:
+            return
+        objectives = [m.group(1) for m in
+                      (objective_re.search(line)
+                       for line in lines) if m is not None]
+        runs.append(CalibrationRun(
+            path.basename(data_file), perf_counter() - start,
+            objectives[-1] if len(objectives) > 0 else None))
+
+    def run_level(self, level: int) -> bool:
+        # every instance of the workload is run level times, level runs at a
+        # time:
+        runs: List[CalibrationRun] = []
+        orchestrator = Orchestrator(level)
+        core_pool = (CorePool(self.cores[:level]) if self.pin_cores
+                     else None)
+        start = perf_counter()
+        completed = orchestrator.run_all(
+            self.run(orchestrator, core_pool, model, data_file, runs)
+            for model, data_file in calibration_workload
+            for _ in range(level))
+        self.levels[level] = (runs, perf_counter() - start)
+        return completed
+
+    def baseline(self) -> Dict[str, float]:
+        runs, _ = self.levels[1]
+        durations: Dict[str, List[float]] = dict()
+        for r in runs:
+            durations.setdefault(r.instance, []).append(r.duration)
+        return {i: mean(ds) for i, ds in durations.items()}
+
+    def slowdown(self, level: int) -> float:
+        baseline = self.baseline()
+        runs, _ = self.levels[level]
+        return mean(r.duration / baseline[r.instance] for r in runs
+                    if r.instance in baseline)
+
+    def throughput(self, level: int) -> float:
+        # runs per minute:
+        runs, wall_time = self.levels[level]
+        return 60 * len(runs) / wall_time
+
+    def deterministic(self) -> bool:
+        objectives: Dict[str, set] = dict()
+        for runs, _ in self.levels.values():
+            for r in runs:
+                objectives.setdefault(r.instance, set()).add(r.objective)
+        return all(len(objs) == 1 for objs in objectives.values())
+
+    def recommend(self) -> int:
+        # the highest level whose slowdown stays within the tolerance:
+        within = [level for level in self.levels
+                  if self.slowdown(level) <= 1 + self.tolerance]
+        return max(within, default=1)
+
+    def calibrate(self, levels: List[int]) -> Union[None, int]:
+        # pinned runs cannot outnumber the cores:
+        levels = sorted({1} | {min(level, len(self.cores))
+                               if self.pin_cores else level
+                               for level in levels if level > 0})
+        for level in levels:
+            if not self.run_level(level):
+                return None
+            runs, wall_time = self.levels[level]
+            if len(runs) == 0:
+                logging.error(f'Calibration: no run of level {level} '
+                              'finished.')
+                return None
+            logging.info(f'Calibration: {level} concurrent runs; '
+                         f'slowdown: {self.slowdown(level):.3f}; '
+                         f'throughput: {self.throughput(level):.2f} runs/min')
+        if not self.deterministic():
+            logging.warning('Calibration: the objectives of the workload '
+                            'differ between runs; the solver does not seem to '
+                            'respect the seed and node limit.')
+        recommendation = self.recommend()
+        logging.info(f'Calibration: recommended number of workers: '
+                     f'{recommendation} (slowdown within '
+                     f'{100 * self.tolerance:g}%)')
+        return recommendation
+
+
+def default_levels(num_cores: int) -> List[int]:
+    # 1, 2, 4, ... and the number of cores:
+    levels = []
+    level = 1
+    while level < num_cores:
+        levels.append(level)
+        level *= 2
+    return levels + [num_cores]
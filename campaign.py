@@ -0,0 +1,157 @@
+import logging
+from typing import Any, Dict, List, Union
+from argparse import ArgumentParser, ArgumentTypeError
+from os import path
+import json
+from fzn_cache import FlatZincCache
+from orchestrator import Orchestrator
+from budget import load_budget
+from best_known import Registry
+from result_store import ResultStore
+from solution_store import SolutionStore
+from run import (Task, add_execution_arguments, expand_data_files,
+                 learn_footprints, lns_runners, memory_admission, memory_limit,
+                 order_tasks, pending_tasks, run_tasks, worker_cores)
+
+
+class CampaignEntry:
+    model: str = None
+    data: List[str] = []
+    output: str = None
+    curated_lns: bool = False
+    asset_types: List[str] = None
+    num_runs: int = None
+    time_limit: int = None
+    budget: Union[None, str] = None
+    best_known: Union[None, str] = None
+    extra: List[str] = []
+
+    def __init__(self, entry: Dict[str, Any], defaults: Dict[str, Any],
+                 base_dir: str):
+        def resolve(p: str) -> str:
+            return path.normpath(path.join(base_dir, path.expanduser(p)))
+
+        def get(key: str, default=None):
+            return entry.get(key, defaults.get(key, default))
+
+        self.model = resolve(entry['model'])
+        data = entry['data']
+        self.data = [resolve(d) for d in
+                     ([data] if isinstance(data, str) else data)]
+        self.output = resolve(entry['output'])
+        self.curated_lns = bool(get('curated_lns', False))
+        self.asset_types = get('asset_types')
+        self.num_runs = int(get('num_runs', 5))
+        self.time_limit = int(get('time_limit', 180000))
+        budget = get('budget')
+        self.budget = None if budget is None else resolve(budget)
+        best_known = get('best_known')
+        self.best_known = (None if best_known is None
+                           else resolve(best_known))
+        self.extra = list(get('extra', []))
+
+
+class Campaign:
+    solver: str = None
+    entries: List[CampaignEntry] = None
+
+    def __init__(self, manifest_path: str):
+        with open(manifest_path, 'rb') as manifest_file:
+            if manifest_path.lower().endswith('.toml'):
+                import tomllib
+                manifest = tomllib.load(manifest_file)
+            else:
+                manifest = json.load(manifest_file)
+        base_dir = path.dirname(path.abspath(manifest_path))
+        defaults = {k: v for k, v in manifest.items() if k != 'entries'}
+        self.solver = path.normpath(
+            path.join(base_dir, path.expanduser(manifest['solver'])))
+        self.entries = [CampaignEntry(e, defaults, base_dir)
+                        for e in manifest.get('entries', [])]
+
+    def tasks(self, **runner_kwargs) -> List[Task]:
+        tasks = []
+        for entry in self.entries:
+            data_files = expand_data_files(entry.data)
+            if len(data_files) == 0:
+                logging.warning(f'{path.basename(entry.model)}: no data files')
+            runners = lns_runners(self.solver, entry.model, entry.output,
+                                  entry.time_limit, entry.extra,
+                                  entry.curated_lns, entry.asset_types,
+                                  budget=(None if entry.budget is None
+                                          else load_budget(entry.budget)),
+                                  best_known=(None if entry.best_known is None
+                                              else Registry(entry.best_known)),
+                                  **runner_kwargs)
+            entry_tasks = pending_tasks(runners, data_files, entry.num_runs)
+            logging.info(f'{path.basename(entry.model)}: '
+                         f'{len(entry_tasks)} tasks')
+            tasks += entry_tasks
+        return tasks
+
+
+if __name__ == '__main__':
+    def file_path(rel_path: str) -> None:
+        abs_path = path.abspath(rel_path)
+        if path.isfile(abs_path):
+            return abs_path
+        raise ArgumentTypeError(f"file_path: {rel_path} is not a valid path.")
+
+    parser = ArgumentParser()
+
+    parser.add_argument(dest='manifest', metavar='<campaign>.{json, toml}',
+                        type=file_path,
+                        help='The campaign manifest listing the models, data '
+                        'files, outputs, asset types and numbers of runs.')
+
+    add_execution_arguments(parser)
+
+    parser.set_defaults(schedule='longest-first')
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    campaign = Campaign(args.manifest)
+
+    fzn_cache = (None if args.fzn_cache is None
+                 else FlatZincCache(args.fzn_cache))
+
+    store = None if args.db is None else ResultStore(args.db)
+
+    solution_store = (None if args.solution_store is None
+                      else SolutionStore(args.solution_store))
+
+    try:
+        num_workers, core_pool = worker_cores(args.cores, args.numa_node,
+                                              args.workers, args.pin)
+    except ValueError as e:
+        logging.error(e)
+        exit(1)
+
+    orchestrator = Orchestrator(num_workers, memory_admission(args))
+
+    # the tasks of all models share one queue, so that no worker is idle
+    # until the whole campaign is done:
+    tasks = order_tasks(campaign.tasks(index_sidecar=args.index_sidecar,
+                                       fzn_cache=fzn_cache,
+                                       orchestrator=orchestrator,
+                                       grace=args.grace,
+                                       cores=core_pool,
+                                       store=store,
+                                       solution_store=solution_store,
+                                       statistics=args.statistics,
+                                       memory_limit=memory_limit(args)),
+                        args.schedule)
+
+    if args.memory_reserve is not None:
+        learn_footprints(tasks)
+
+    logging.info(f'Campaign: {path.basename(args.manifest)}')
+    logging.info(f'Number of models: {len(campaign.entries)}')
+    logging.info(f"Number of tasks: {len(tasks)}")
+    logging.info(f'Number of workers: {num_workers}')
+    if core_pool is not None:
+        logging.info('Cores: ' + ', '.join(map(str, core_pool.cores)))
+
+    run_tasks(tasks, orchestrator)
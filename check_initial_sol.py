@@ -1,13 +1,12 @@
-from concurrent.futures import ThreadPoolExecutor
 import logging
 from sys import exc_info
-from typing import List
+from typing import List, Union
 from argparse import ArgumentParser, ArgumentTypeError
 from glob import glob
 from os import path
-import subprocess
 from shutil import which
 import re
+from orchestrator import Orchestrator
 
 
 class MiniZincRunner:
@@ -15,41 +14,50 @@ class MiniZincRunner:
     solver: str = None
     data: List[str] = []
     minizinc_path: str
-    kill: bool = False
+    time_limit: Union[None, int] = None
+    orchestrator: Orchestrator = None
+    # milliseconds past the time limit before a run is killed:
+    grace: int = 10000
 
     re_unsatisfiable = re.compile(r'(=====UNSATISFIABLE=====)')
 
-    def __init__(self, model, solver):
+    def __init__(self, model, solver, time_limit: Union[None, int] = None,
+                 grace: int = 10000,
+                 orchestrator: Union[None, Orchestrator] = None):
         self.model = model
         self.solver = solver
         self.minizinc_path = which('minizinc')
+        self.time_limit = time_limit
+        self.orchestrator = (orchestrator if orchestrator is not None
+                             else Orchestrator(1))
+        self.grace = grace
 
     @classmethod
     def is_unsat(cls, output):
         return cls.re_unsatisfiable.search(output) is not None
 
-    def run_dzn(self, data_file: str) -> None:
+    async def run_dzn(self, data_file: str) -> None:
         args = [self.minizinc_path,
                 self.model,
                 '--solver', 'gecode',
                 '-d', data_file]
+        deadline = None
+        if self.time_limit is not None:
+            args += ['--time-limit', str(self.time_limit)]
+            deadline = (self.time_limit + self.grace) / 1000
 
-        process = subprocess.Popen(args, stdout=subprocess.PIPE)
+        lines = []
+        result = await self.orchestrator.run(args, lines.append, deadline)
 
-        try:
-            stdout, stderr = process.communicate()
-        except subprocess.TimeoutExpired:
-            logging.warning("Timeout: quitting without appending solution.")
-            return
-
-        if self.kill:
+        if self.orchestrator.killed:
             logging.warning("KILLED: quitting without appending solution.")
             return
 
-        if stderr is not None:
-            logging.warning(stderr.decode('utf-8'))
+        if not result.finished:
+            logging.warning("Timeout: quitting without appending solution.")
+            return
 
-        output = stdout.decode('utf-8')
+        output = ''.join(lines)
         is_unsat = self.is_unsat(output)
 
         if is_unsat is None:
@@ -101,6 +109,15 @@ if __name__ == '__main__':
                         type=str, help='The dzn or JSON instance file(s) '
                         'to run the model on.')
 
+    parser.add_argument('--time-limit', dest='time_limit', type=int,
+                        default=None,
+                        help='the time limit for MiniZinc in milliseconds')
+
+    parser.add_argument('--grace', dest='grace', type=int, default=10000,
+                        help='the number of milliseconds past the time limit '
+                        'after which a run and all its solver processes are '
+                        'killed.')
+
     args = parser.parse_args()
 
     logging.basicConfig(level=logging.INFO)
@@ -118,15 +135,17 @@ if __name__ == '__main__':
         seen_data_files.add(data_file)
     data_files = list(sorted(data_files))
 
-    mzn_runner = MiniZincRunner(args.model, args.solver)
+    orchestrator = Orchestrator(args.num_processes
+                                if args.num_processes > 0 else 16)
+
+    mzn_runner = MiniZincRunner(args.model, args.solver, args.time_limit,
+                                args.grace, orchestrator)
 
     tasks = list(range(len(data_files)))
 
-    def run(di: int):
-        if mzn_runner.kill:
-            return
+    async def run(di: int):
         try:
-            mzn_runner.run_dzn(data_files[di])
+            await mzn_runner.run_dzn(data_files[di])
         except Exception as e:
             exc_type, exc_obj, exc_tb = exc_info()
             fname = path.split(exc_tb.tb_frame.f_code.co_filename)[1]
@@ -138,13 +157,7 @@ if __name__ == '__main__':
             pass
 
     logging.info(f'Solver: {args.solver}')
+    logging.info(f'Number of processes: {orchestrator.concurrency}')
     logging.info(f"Number of tasks: {len(tasks)}")
-    with ThreadPoolExecutor(max_workers=16) as executor:
-        try:
-            for task in tasks:
-                executor.submit(run, *[task])
-            executor.shutdown(True)
-        except (KeyboardInterrupt, SystemExit):
-            logging.warning("KILLED: shutting down threads...")
-            mzn_runner.kill = True
-            executor.shutdown(False)
+    if not orchestrator.run_all(run(task) for task in tasks):
+        exit(1)
@@ -52,8 +52,9 @@ class JsonComparer:
 
     def parse(self, json_path):
         with open(json_path, 'r') as json_file:
-            data = json.load(json_file)
+            self.parse_data(json.load(json_file))
 
+    def parse_data(self, data):
         model_name = data['model']
         model_acronym = data['acronym']
         model_data = dict()
@@ -265,17 +266,28 @@ if __name__ == '__main__':
                         metavar='<data file>.txt[-*]', nargs='*',
                         type=str, help='txt input files.')
 
+    parser.add_argument('--db', dest='db', metavar='<results>.sqlite',
+                        type=str, default=None,
+                        help='read the JSON written by to_json.py --db from '
+                        'this SQLite result store.')
+
+    parser.add_argument('--models', dest='models', nargs='*', type=str,
+                        default=None, metavar='<name pattern>',
+                        help='the names (the to_json.py output file names '
+                        'without extension) of the stored JSON to compare; '
+                        'defaults to all.')
+
     parser.add_argument('-p', '--plot', dest='plot', default=False,
                         action='store_true', help='show scatter plots.')
 
     args = parser.parse_args()
 
-    if args.data_files is None:
+    if args.data_files is None and args.db is None:
         exit(1)
 
     data_files = []
     seen_data_files = set()
-    for data_file in (fp for glob_list in args.data_files
+    for data_file in (fp for glob_list in (args.data_files or [])
                       for fp in glob(glob_list)):
         if data_file in seen_data_files:
             continue
@@ -289,6 +301,11 @@ if __name__ == '__main__':
     for data_file in data_files:
         json_comparer.parse(data_file)
 
+    if args.db is not None:
+        from result_store import ResultStore
+        for _, data in ResultStore(args.db).aggregates(args.models):
+            json_comparer.parse_data(data)
+
     if args.plot:
         json_comparer.scatter_plot()
     else:
@@ -1,6 +1,9 @@
-from typing import List, Set, Any, Dict
+from typing import List, Set, Any, Dict, Tuple, Union
 from argparse import ArgumentParser
+from array import array
+from heapq import heapify, heappop, heappush
 import logging
+import re
 
 
 class Variable:
@@ -42,126 +45,472 @@ class Graph:
         self.incoming.get(destination, set()).remove(origin)
  
     def strongly_connected_components(self):
-        # retrieve all vertices:
-        vertices = set(self.outgoing.keys()).union(self.incoming.keys())
-        # set current timestamp/index
-        cur_index = 0
-        # initialize all indices and lowlinks to None:
-        index = {u: None for u in vertices}
-        lowlink = {u: None for u in vertices}
-        # create empty stack:
+        # the components are computed on the compact representation, which
+        # does not recurse (and so does not hit the recursion limit):
+        compact = CompactGraph.from_graph(self)
+        return [[compact.labels[u] for u in component]
+                for component in compact.strongly_connected_components()]
+
+
+class CompactGraph:
+    # the vertices are interned as the integers 0, ..., n - 1 (labels[u] is
+    # the original vertex of u), and the arcs are kept in compressed sparse
+    # row arrays: the successors of u are targets[offsets[u]:offsets[u + 1]].
+    # The channelling vertices that share their inputs can be bundled: their
+    # inputs have an arc to one bundle vertex, which has an arc to each of
+    # them (instead of an arc from each input to each of them):
+    labels: List[Any] = None
+    ids: Dict[Any, int] = None
+    offsets: array = None
+    targets: array = None
+    in_degree: array = None
+    # the bundle vertices:
+    bundles: bytearray = None
+    # fan_out[u] is the number of vertices that u channels, where an arc to
+    # a bundle counts as an arc to each vertex of the bundle:
+    fan_out: array = None
+
+    def __init__(self, labels: List[Any], origins: array,
+                 destinations: array, bundles: Union[None, bytearray] = None):
+        n = len(labels)
+        self.labels = labels
+        self.ids = {label: u for u, label in enumerate(labels)}
+        # counting sort of the arcs by their origin:
+        offsets = array('q', bytes(8 * (n + 1)))
+        for u in origins:
+            offsets[u + 1] += 1
+        for u in range(n):
+            offsets[u + 1] += offsets[u]
+        targets = array('q', bytes(8 * len(origins)))
+        position = array('q', offsets)
+        for u, v in zip(origins, destinations):
+            targets[position[u]] = v
+            position[u] += 1
+        # parallel arcs are removed, as in Graph:
+        size = 0
+        for u in range(n):
+            begin, end = offsets[u], offsets[u + 1]
+            offsets[u] = size
+            if end - begin == 1:
+                targets[size] = targets[begin]
+                size += 1
+            elif end - begin > 1:
+                successors = sorted(set(targets[begin:end]))
+                targets[size:size + len(successors)] = array('q', successors)
+                size += len(successors)
+        offsets[n] = size
+        del targets[size:]
+        self.offsets = offsets
+        self.targets = targets
+        self.in_degree = array('q', bytes(8 * n))
+        for v in targets:
+            self.in_degree[v] += 1
+        self.set_bundles(bytearray(n) if bundles is None else bundles)
+
+    def set_bundles(self, bundles: bytearray) -> None:
+        n = len(self.labels)
+        self.bundles = bundles
+        self.fan_out = array('q', (self.offsets[u + 1] - self.offsets[u]
+                                   for u in range(n)))
+        if any(bundles):
+            for u in range(n):
+                if self.fan_out[u] > 0 and not bundles[u]:
+                    self.fan_out[u] = sum(
+                        self.fan_out[v] if bundles[v] else 1
+                        for v in self.successors(u))
+
+    @staticmethod
+    def from_arcs(arcs) -> 'CompactGraph':
+        # the vertices are interned in the order they first occur:
+        ids: Dict[Any, int] = dict()
+        labels: List[Any] = []
+        origins = array('q')
+        destinations = array('q')
+
+        def intern(label) -> int:
+            u = ids.get(label)
+            if u is None:
+                u = ids[label] = len(labels)
+                labels.append(label)
+            return u
+
+        for origin, destination in arcs:
+            origins.append(intern(origin))
+            destinations.append(intern(destination))
+        return CompactGraph(labels, origins, destinations)
+
+    @staticmethod
+    def from_graph(graph: Graph) -> 'CompactGraph':
+        return CompactGraph.from_arcs((u, v) for u, vs in graph.outgoing.items()
+                                      for v in vs)
+
+    @staticmethod
+    def from_channelling(variables: Set[Variable], channelling,
+                         bundle: bool = True) -> 'CompactGraph':
+        # the variables and one vertex per channelling relation, with arcs
+        # from its inputs to it and from it to its outputs; the relations
+        # with the same inputs (at least two) share a bundle of them:
+        num_relations = dict()
+        if bundle:
+            for inputs, _, _ in channelling:
+                if len(inputs) > 1:
+                    key = frozenset(inputs)
+                    num_relations[key] = num_relations.get(key, 0) + 1
+        bundle_vertices = dict()
+
+        def arcs():
+            for k, (inputs, constraint, outputs) in enumerate(channelling):
+                channelling_vertex = f'{constraint}_{len(variables) + k}'
+                key = frozenset(inputs)
+                if num_relations.get(key, 0) > 1:
+                    bundle_vertex = bundle_vertices.get(key)
+                    if bundle_vertex is None:
+                        b = len(variables) + len(channelling) + \
+                            len(bundle_vertices)
+                        bundle_vertex = bundle_vertices[key] = f'inputs_{b}'
+                        for i in inputs:
+                            yield i, bundle_vertex
+                    yield bundle_vertex, channelling_vertex
+                else:
+                    for i in inputs:
+                        yield i, channelling_vertex
+                for o in outputs:
+                    yield channelling_vertex, o
+        graph = CompactGraph.from_arcs(arcs())
+        if len(bundle_vertices) > 0:
+            bundles = bytearray(len(graph))
+            for bundle_vertex in bundle_vertices.values():
+                bundles[graph.ids[bundle_vertex]] = 1
+            graph.set_bundles(bundles)
+        return graph
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def successors(self, u: int) -> array:
+        return self.targets[self.offsets[u]:self.offsets[u + 1]]
+
+    def out_degree(self, u: int) -> int:
+        return self.offsets[u + 1] - self.offsets[u]
+
+    def strongly_connected_components(self) -> List[List[int]]:
+        # Tarjan's algorithm with an explicit stack of the vertices whose
+        # successors are being visited; next_arc[v] is the next arc of v to
+        # follow:
+        n = len(self.labels)
+        offsets = self.offsets
+        targets = self.targets
+        index = array('q', [-1]) * n
+        lowlink = array('q', bytes(8 * n))
+        on_stack = bytearray(n)
+        next_arc = array('q', offsets)
         st = []
-        # mark all variables as not on stack:
-        on_stack = {u: False for u in vertices}
-        # components will hold all strongly connected components when 
-        # algorithm terminates:
-        components: List[List[Any]] = []
-
-        # recursive inner helper function:
-        def scc_util(v):
-            # initialize vertex:
-            nonlocal cur_index
-            index[v] = cur_index
-            lowlink[v] = cur_index
-            st.append(v)
-            on_stack[v] = True
-            # increase current index
+        components: List[List[int]] = []
+        cur_index = 0
+        for root in range(n):
+            if index[root] != -1:
+                continue
+            if offsets[root] == offsets[root + 1]:
+                # a vertex without successors is a component of its own:
+                index[root] = cur_index
+                cur_index += 1
+                components.append([root])
+                continue
+            index[root] = lowlink[root] = cur_index
             cur_index += 1
-
-            # iterate over neighbours:
-            for w in self.outgoing.get(v, set()):
-                if index[w] is None:
-                    # neighbour is unvisited, recurse
-                    scc_util(w)
-                    lowlink[v] = min(lowlink[v], lowlink[w])
-                elif on_stack[w]:
-                    # neighbour has been visited, update lowlink
-                    lowlink[v] = min(lowlink[v], index[w])
-
-            # an scc has been found:
-            if lowlink[v] == index[v]:
-                # add found scc to list of components:
-                components.append([])
-                # add all vertices of scc to added component:
-                while True:
-                    w = st.pop()
-                    on_stack[w] = False
-                    components[-1].append(w)
-                    if w == v:
-                        break
-
-        for v in vertices:
-            if index[v] is None:
-                scc_util(v)
-        # reverse order of components, as no vertex in component[i] should have
-        # no outgoing arcs to any vertex in any component[j] with j > i:
+            st.append(root)
+            on_stack[root] = 1
+            work = [root]
+            while len(work) > 0:
+                v = work[-1]
+                arc = next_arc[v]
+                if arc < offsets[v + 1]:
+                    next_arc[v] = arc + 1
+                    w = targets[arc]
+                    if index[w] == -1 and offsets[w] == offsets[w + 1]:
+                        index[w] = cur_index
+                        cur_index += 1
+                        components.append([w])
+                    elif index[w] == -1:
+                        # neighbour is unvisited, visit it next:
+                        index[w] = lowlink[w] = cur_index
+                        cur_index += 1
+                        st.append(w)
+                        on_stack[w] = 1
+                        work.append(w)
+                    elif on_stack[w] and index[w] < lowlink[v]:
+                        lowlink[v] = index[w]
+                    continue
+                # all successors of v are visited:
+                work.pop()
+                if len(work) > 0 and lowlink[v] < lowlink[work[-1]]:
+                    lowlink[work[-1]] = lowlink[v]
+                if lowlink[v] == index[v]:
+                    components.append([])
+                    while True:
+                        w = st.pop()
+                        on_stack[w] = 0
+                        components[-1].append(w)
+                        if w == v:
+                            break
+        # no vertex in component[i] has an arc to a vertex in component[j]
+        # with j > i:
         return list(reversed(components))
 
 
-def dependecy_curation(variables: Set[Variable], channelling):
-    vertices = set(variables)
-    channelling_graph = Graph()
-
-    # add arcs to channelling graph from channelling relations:
-    for inputs, constraint, outputs in channelling:
-        channelling_vertex = f'{constraint}_{len(vertices)}'
-        vertices.add(channelling_vertex)
-        for i in inputs:
-            channelling_graph.add(i, channelling_vertex)
-        for o in outputs:
-            channelling_graph.add(channelling_vertex, o)
-    # the visited vertices:
-    visited = set()
-    # the resulting freeze set:
-    search_vars = set()
-    # all strongly connected components:
-    components = channelling_graph.strongly_connected_components()
-
-    # variable ordering comparator:
-    def comparator(x: Variable):
-        return (len(channelling_graph.incoming.get(x, set())),
-                -len(channelling_graph.outgoing.get(x, set())))
-
-    for component in components:
-        # add all variables in the component to the queue
-        q = [x for x in component if x in variables and x not in visited]
-        # make the queueu a min-priority queue:
-        q.sort(key=comparator)
-        while len(q) > 0:
-            x = q.pop(0)
-            if x in visited:
-                continue
-            assert x in variables
+# the items of a FlatZinc file:
+fzn_array_re = re.compile(r'^array\s*\[[^\]]*\]\s*of\s+var\b[^:]*:\s*'
+                          r'([A-Za-z_][A-Za-z0-9_]*)[^=]*=\s*\[(.*)\]\s*;$',
+                          re.DOTALL)
+# a variable, and the variable it is an alias of (e.g. the output variable
+# w in var 0..40: w :: output_var = X_INTRODUCED_0_;):
+fzn_var_re = re.compile(r'^var\b[^:]*:\s*([A-Za-z_][A-Za-z0-9_]*)([^=;]*)'
+                        r'(?:=\s*([^;]*?))?\s*;?$', re.DOTALL)
+fzn_constraint_re = re.compile(r'^constraint\s+([A-Za-z_][A-Za-z0-9_]*)\s*\(')
+fzn_defines_var_re = re.compile(
+    r'defines_var\s*\(\s*([A-Za-z_][A-Za-z0-9_]*)\s*\)')
+fzn_identifier_re = re.compile(r'\b[A-Za-z_][A-Za-z0-9_]*\b')
+
+
+def fzn_items(fzn_file):
+    # the items (ending with ';') of a FlatZinc file, one at a time:
+    item = []
+    for line in fzn_file:
+        line = line.strip()
+        # most items are on one line:
+        if len(item) == 0 and line.endswith(';'):
+            yield line
+            continue
+        if len(line) == 0 or line.startswith('%'):
+            continue
+        item.append(line)
+        if line.endswith(';'):
+            yield ' '.join(item)
+            item = []
+
+
+def read_fzn(fzn_path: str) -> Tuple[Set[str], CompactGraph]:
+    # the channelling graph of a FlatZinc file: its variables, and a
+    # channelling vertex for each constraint that defines a variable (with
+    # the defines_var annotation), with arcs from the other variables of the
+    # constraint to it and from it to the defined variable. The file is read
+    # one item at a time, and only the variables and arcs are kept. The
+    # constraints with the same (at least two) inputs share a bundle of them.
+    # An alias is the same vertex as its variable (and takes over its label),
+    # and the variables introduced by the flattening (var_is_introduced) are
+    # not decision variables; those that are defined (is_defined_var) are
+    # channelled by the constraint that defines them:
+    ids: Dict[str, int] = dict()
+    # array name -> the variables of the array:
+    arrays: Dict[str, array] = dict()
+    origins = array('q')
+    destinations = array('q')
+    labels: List[str] = []
+    # inputs -> the first channelling vertex with them and the position of
+    # its arcs, until a second one shares them:
+    first_with: Dict[frozenset, Tuple[int, int]] = dict()
+    # inputs -> their bundle vertex:
+    bundle_of: Dict[frozenset, int] = dict()
+    # the vertices of the introduced variables:
+    introduced: Set[int] = set()
+
+    def intern(label: str) -> int:
+        u = ids.get(label)
+        if u is None:
+            u = ids[label] = len(labels)
+            labels.append(label)
+        return u
+
+    def variables(arguments: str):
+        for name in fzn_identifier_re.findall(arguments):
+            if name in arrays:
+                yield from arrays[name]
+            elif name in ids:
+                yield ids[name]
+
+    num_constraints = 0
+    with open(fzn_path, 'r') as fzn_file:
+        for item in fzn_items(fzn_file):
+            if item.startswith('var'):
+                match = fzn_var_re.match(item)
+                if match is None:
+                    continue
+                name, annotations, alias_of = match.groups()
+                if alias_of is not None and alias_of in ids:
+                    u = ids[name] = ids[alias_of]
+                    labels[u] = name
+                    introduced.discard(u)
+                    continue
+                u = intern(name)
+                if 'var_is_introduced' in annotations:
+                    introduced.add(u)
+            elif item.startswith('array'):
+                match = fzn_array_re.match(item)
+                if match is not None:
+                    arrays[match.group(1)] = array(
+                        'q', variables(match.group(2)))
+            elif item.startswith('constraint'):
+                match = fzn_constraint_re.match(item)
+                # the annotations follow the arguments:
+                head, _, annotations = item.partition('::')
+                defined = fzn_defines_var_re.search(annotations)
+                if match is None or defined is None:
+                    continue
+                output = ids.get(defined.group(1))
+                if output is None:
+                    continue
+                channelling_vertex = intern(
+                    f'{match.group(1)}#{num_constraints}')
+                num_constraints += 1
+                arguments = head[match.end():head.rindex(')')]
+                inputs = set(variables(arguments))
+                inputs.discard(output)
+                key = frozenset(inputs) if len(inputs) > 1 else None
+                if key in first_with:
+                    # the arcs of the first vertex now go to the bundle:
+                    first, position = first_with.pop(key)
+                    bundle = intern(f'inputs#{len(bundle_of)}')
+                    bundle_of[key] = bundle
+                    for a in range(position, position + len(inputs)):
+                        destinations[a] = bundle
+                    origins.append(bundle)
+                    destinations.append(first)
+                if key in bundle_of:
+                    origins.append(bundle_of[key])
+                    destinations.append(channelling_vertex)
+                else:
+                    if key is not None:
+                        first_with[key] = (channelling_vertex, len(origins))
+                    for u in inputs:
+                        origins.append(u)
+                        destinations.append(channelling_vertex)
+                origins.append(channelling_vertex)
+                destinations.append(output)
+    bundles = bytearray(len(labels))
+    for bundle in bundle_of.values():
+        bundles[bundle] = 1
+    num_variables = len(labels) - num_constraints - len(bundle_of)
+    logging.info(f'{fzn_path}: {num_variables} variables '
+                 f'({len(introduced)} introduced), {num_constraints} '
+                 f'channelling constraints, {len(bundle_of)} shared input '
+                 'bundles')
+    return ({label for u, label in enumerate(labels)
+             if '#' not in label and u not in introduced},
+            CompactGraph(labels, origins, destinations, bundles))
+
+
+def incoming_priority(graph: CompactGraph, incoming: array,
+                      removed: bytearray, x: int) -> Tuple[int, int]:
+    # the variables with the fewest remaining incoming arcs first, and of
+    # those the ones that channel the most:
+    return incoming[x], 0 if removed[x] else -graph.fan_out[x]
+
+
+def fan_out_priority(graph: CompactGraph, incoming: array,
+                     removed: bytearray, x: int) -> Tuple[int, int]:
+    # the variables that channel the most first:
+    return 0 if removed[x] else -graph.fan_out[x], incoming[x]
+
+
+# the variable orderings of the curation:
+priorities = {'incoming': incoming_priority, 'fan-out': fan_out_priority}
+
+
+class Curator:
+    # curates sets of variables of one channelling graph, which is not
+    # changed: each query has its own visited and removed vertices and
+    # remaining incoming arcs, and the strongly connected components are
+    # found once, so that variants (other priorities or subsets of the
+    # variables) can be curated on the same graph:
+    graph: CompactGraph = None
+    components: List[List[int]] = None
+
+    def __init__(self, graph: CompactGraph):
+        self.graph = graph
+        self.components = graph.strongly_connected_components()
+
+    def curate(self, variables, priority=incoming_priority) -> Set[Any]:
+        graph = self.graph
+        n = len(graph)
+        is_variable = bytearray(n)
+        for x in variables:
+            u = graph.ids.get(x)
+            if u is not None:
+                is_variable[u] = 1
+        # the arcs from a vertex are removed when it is visited by the DFS,
+        # so only the number of remaining incoming arcs of each vertex is
+        # kept:
+        incoming = array('q', graph.in_degree)
+        removed = bytearray(n)
+        # the visited vertices:
+        visited = bytearray(n)
+        # the resulting freeze set:
+        search_vars = set()
+
+        # variable ordering comparator:
+        def comparator(x: int):
+            return priority(graph, incoming, removed, x)
+
+        def curate(x: int):
             # previous visited variables cannot channel x, add to freeze set:
-            search_vars.add(x)
-            visited.add(x)  # mark as visited
+            search_vars.add(graph.labels[x])
+            visited[x] = 1  # mark as visited
             # start DFS:
             stack = [x]
             while len(stack) > 0:
                 u = stack.pop()
-                # retrieve neighbours of u:
-                outgoing = set(channelling_graph.outgoing.get(u, set()))
                 # remove each outgoing arc from u from the channelling graph:
-                # (Any channelled variables will be retrieved in the next step)
+                # (Any channelled variables will be retrieved in the next
+                # step)
+                removed[u] = 1
+                outgoing = graph.successors(u)
                 for v in outgoing:
-                    channelling_graph.remove(u, v)
+                    incoming[v] -= 1
                 for v in outgoing:
                     should_visit = (
-                        v not in visited and
-                        (v in variables or
-                         len(channelling_graph.incoming.get(v, set())) == 0))
+                        not visited[v] and
+                        (is_variable[v] or incoming[v] == 0))
                     if should_visit:
                         # variable v can be channelled by the variables in
                         # visited:
-                        visited.add(v)
+                        visited[v] = 1
                         stack.append(v)
-            # remove each visited variable from the component in q:
-            for v in component:
-                if v in variables and v in visited and v in q:
-                    q.remove(v)
-            # update the priorities of the variables in q:
-            q.sort(key=comparator)
-    return search_vars
+
+        for component in self.components:
+            if len(component) == 1:
+                # most components of a flattened model are single vertices:
+                if is_variable[component[0]] and not visited[component[0]]:
+                    curate(component[0])
+                continue
+            # the variables of the component in a min-priority queue; the
+            # priority of a variable only changes when arcs into it are
+            # removed, so outdated entries are pushed again with their
+            # current priority when they are popped (ties keep the order of
+            # the component):
+            q = [(comparator(x), i, x) for i, x in enumerate(component)
+                 if is_variable[x] and not visited[x]]
+            heapify(q)
+            while len(q) > 0:
+                priority_x, i, x = heappop(q)
+                if visited[x]:
+                    continue
+                if priority_x != comparator(x):
+                    heappush(q, (comparator(x), i, x))
+                    continue
+                curate(x)
+        return search_vars
+
+
+def dependecy_curation(variables: Set[Variable],
+                       channelling: Union[List[Any], CompactGraph]):
+    # channelling is either a list of (inputs, constraint, outputs)
+    # relations or a CompactGraph of the variables and the channelling
+    # vertices:
+    channelling_graph = (channelling
+                         if isinstance(channelling, CompactGraph)
+                         else CompactGraph.from_channelling(variables,
+                                                            channelling))
+    return Curator(channelling_graph).curate(variables)
 
 
 if __name__ == '__main__':
@@ -171,10 +520,28 @@ if __name__ == '__main__':
                         metavar='{tsptw, smsd, jsp, rcs}', type=str,
                         help='the problem acronym')
 
+    parser.add_argument('--fzn', dest='fzn', metavar='<model>.fzn', type=str,
+                        default=None,
+                        help='instead of a problem, curate the variables of '
+                        'this FlatZinc file, whose channelling relations are '
+                        'the constraints that define a variable.')
+
+    parser.add_argument('--priority', dest='priority',
+                        choices=sorted(priorities), default='incoming',
+                        help='the order in which the variables of a strongly '
+                        'connected component are curated.')
+
     args = parser.parse_args()
 
     logging.basicConfig(level=logging.INFO)
 
+    if args.fzn is not None:
+        fzn_vars, channelling_graph = read_fzn(args.fzn)
+        search_vars = Curator(channelling_graph).curate(
+            fzn_vars, priorities[args.priority])
+        print('{' + ', '.join(sorted(search_vars)) + '}')
+        exit(0)
+
     channelling = []
     
     problem: str = args.problem.strip().lower()
@@ -262,7 +629,8 @@ if __name__ == '__main__':
     for i, _, o in channelling:
         vars.update(i)
         vars.update(o)
-    search_vars = dependecy_curation(vars, channelling)
+    search_vars = Curator(CompactGraph.from_channelling(
+        vars, channelling)).curate(vars, priorities[args.priority])
     search_vars = sorted(search_vars, key=lambda v: v.identifier)
 
     print('{' + ', '.join(map(str, search_vars)) + '}')
@@ -0,0 +1,81 @@
+from typing import List, Set, Tuple
+from argparse import ArgumentParser
+from time import perf_counter
+import logging
+from dcs import CompactGraph, Variable, dependecy_curation
+
+
+def cyclic_channelling(size: int) -> Tuple[Set[Variable], List]:
+    # one strongly connected component of size variables that all channel
+    # each other, like the placedIn and load variables of the steel mill slab
+    # design; each variable is a search variable until all of them are:
+    placed_in = [Variable(f'placedIn[{o + 1}]') for o in range(size)]
+    load = [Variable(f'load[{s + 1}]') for s in range(size)]
+    channelling = [(set(placed_in), 'bin_packing_load', set(load))]
+    for o in range(size):
+        channelling.append(({load[o]}, 'element', {placed_in[o]}))
+    return set(placed_in) | set(load), channelling
+
+
+def steel_mill_channelling(num_orders: int,
+                           num_colours: int) -> Tuple[Set[Variable], List]:
+    # the channelling of the steel mill slab design of dcs.py, where every
+    # (slab, colour) pair has all placedIn variables as its inputs:
+    num_slabs = num_orders
+    placed_in = [Variable(f'placedIn[{o + 1}]') for o in range(num_orders)]
+    load = [Variable(f'load[{s + 1}]') for s in range(num_slabs)]
+    has_colour = [[Variable(f'hasColor[{s + 1}][{c + 1}]')
+                   for c in range(num_colours)] for s in range(num_slabs)]
+    n_colours = [Variable(f'nColors[{s + 1}]') for s in range(num_slabs)]
+    objective = Variable('objective')
+    channelling = [(set(placed_in), 'bin_packing_load', set(load))]
+    for s in range(num_slabs):
+        for c in range(num_colours):
+            channelling.append((set(placed_in), 'bool2int exists',
+                                {has_colour[s][c]}))
+    for s in range(num_slabs):
+        channelling.append((set(has_colour[s]), 'sum', {n_colours[s]}))
+    channelling.append((set(load), 'sum element', {objective}))
+    variables = {v for inputs, _, outputs in channelling
+                 for v in inputs | outputs}
+    return variables, channelling
+
+
+def measure(variables: Set[Variable], channelling: List,
+            bundle: bool = True) -> str:
+    start = perf_counter()
+    graph = CompactGraph.from_channelling(variables, channelling, bundle)
+    built = perf_counter()
+    graph.strongly_connected_components()
+    components = perf_counter()
+    dependecy_curation(variables, graph)
+    curated = perf_counter()
+    return (f'{len(variables)}\t{len(graph)}\t{len(graph.targets)}\t'
+            f'{built - start:.3f}\t{components - built:.3f}\t'
+            f'{curated - components:.3f}')
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+
+    parser.add_argument('--sizes', dest='sizes', type=int, nargs='*',
+                        default=[1000, 2000, 4000, 8000, 16000, 32000],
+                        help='the numbers of variables per component.')
+    parser.add_argument('--steel-mill', dest='steel_mill', type=int, nargs=2,
+                        metavar=('ORDERS', 'COLOURS'), default=None,
+                        help='instead, compare the steel mill slab design '
+                        'channelling with and without shared input bundles.')
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    print('variables\tvertices\tarcs\tbuild (s)\tscc (s)\tcuration (s)')
+    if args.steel_mill is not None:
+        variables, channelling = steel_mill_channelling(*args.steel_mill)
+        for bundle in (False, True):
+            print(measure(variables, channelling, bundle) +
+                  ('\t(bundled)' if bundle else ''))
+        exit(0)
+    for size in args.sizes:
+        print(measure(*cyclic_channelling(size)))
@@ -3,11 +3,10 @@ from sys import exc_info
 from typing import List, Union
 from argparse import ArgumentParser, ArgumentTypeError, REMAINDER
 from glob import glob
-from os import path
-import subprocess
+from os import cpu_count, path
 from shutil import which
-from multiprocessing.pool import Pool
 import re
+from orchestrator import Orchestrator
 
 
 def to_int_list(str_array: str) -> List[int]:
@@ -21,14 +20,31 @@ class MiniZincRunner:
     extra: List[str] = []
     data: List[str] = []
     minizinc_path: str
+    orchestrator: Orchestrator = None
+    # milliseconds past the time limit before a run is killed:
+    grace: int = 10000
 
     solution_re = re.compile(r'(solution\s*=\s*\[[^\]]*\]);')
 
-    def __init__(self, model, solver, extra):
+    def __init__(self, model, solver, extra, grace: int = 10000,
+                 orchestrator: Union[None, Orchestrator] = None):
         self.model = model
         self.solver = solver
         self.extra = extra if extra is not None else []
         self.minizinc_path = which('minizinc')
+        self.orchestrator = (orchestrator if orchestrator is not None
+                             else Orchestrator(1))
+        self.grace = grace
+
+    def deadline(self) -> Union[None, float]:
+        # the time limit is passed to MiniZinc through the extra flags:
+        if '--time-limit' not in self.extra:
+            return None
+        i = self.extra.index('--time-limit')
+        try:
+            return (int(self.extra[i + 1]) + self.grace) / 1000
+        except (IndexError, ValueError):
+            return None
 
     @classmethod
     def get_solution(cls, output: str) -> Union[None, str]:
@@ -47,7 +63,7 @@ class MiniZincRunner:
                     return False
         return True
 
-    def run_dzn(self, data_file: str) -> None:
+    async def run_dzn(self, data_file: str) -> None:
         if not self.should_run(data_file):
             return
 
@@ -56,18 +72,18 @@ class MiniZincRunner:
                 '--solver', self.solver,
                 '-d', data_file] + self.extra
 
-        process = subprocess.Popen(args, stdout=subprocess.PIPE)
+        lines = []
+        result = await self.orchestrator.run(args, lines.append,
+                                             self.deadline())
 
-        try:
-            stdout, stderr = process.communicate()
-        except subprocess.TimeoutExpired:
-            process.kill()
+        if self.orchestrator.killed:
             return
 
-        if stderr is not None:
-            logging.warning(stderr.decode('utf-8'))
+        if not result.finished:
+            logging.warning(f'{path.basename(data_file)}: timeout')
+            return
 
-        output = stdout.decode('utf-8')
+        output = ''.join(lines)
         solution = self.get_solution(output)
 
         if solution is None:
@@ -124,6 +140,11 @@ if __name__ == '__main__':
                         type=str, help='The dzn or JSON instance file(s) '
                         'to run the model on.')
 
+    parser.add_argument('--grace', dest='grace', type=int, default=10000,
+                        help='the number of milliseconds past the time limit '
+                        'after which a run and all its solver processes are '
+                        'killed.')
+
     parser.add_argument('--extra', nargs=REMAINDER, dest='extra',
                         type=str,
                         help='The extra flags (with leading dashes) that are '
@@ -148,20 +169,24 @@ if __name__ == '__main__':
         seen_data_files.add(data_file)
     data_files = list(sorted(data_files))
 
+    orchestrator = Orchestrator(args.num_processes if args.num_processes > 0
+                                else cpu_count() or 1)
+
     mzn_runner = MiniZincRunner(args.model, args.solver,
-                                args.extra if args.extra is not None else [])
+                                args.extra if args.extra is not None else [],
+                                args.grace, orchestrator)
 
     tasks = [di for di in range(len(data_files))
              if mzn_runner.should_run(data_files[di])]
 
     tasks = [(di, ti) for ti, di in enumerate(tasks)]
 
-    def run(di: int, ti: int):
+    async def run(di: int, ti: int):
         logging.info(f'Run {ti + 1}/{len(tasks)}; ' +
                      f'{path.basename(data_files[di])}; extra: ' +
                      ' '.join(mzn_runner.extra))
         try:
-            mzn_runner.run_dzn(data_files[di])
+            await mzn_runner.run_dzn(data_files[di])
         except Exception as e:
             exc_type, exc_obj, exc_tb = exc_info()
             fname = path.split(exc_tb.tb_frame.f_code.co_filename)[1]
@@ -172,13 +197,8 @@ if __name__ == '__main__':
         finally:
             pass
 
-    if isinstance(args.num_processes, int) and args.num_processes > 0:
-        pool = Pool(args.num_processes)
-    else:
-        pool = Pool()
     logging.info(f'Solver: {args.solver}')
-    logging.info(f'Number of processes: {pool._processes}')
+    logging.info(f'Number of processes: {orchestrator.concurrency}')
     logging.info(f"Number of tasks: {len(tasks)}")
-    pool.starmap_async(run, tasks)
-    pool.close()
-    pool.join()
+    if not orchestrator.run_all(run(*task) for task in tasks):
+        exit(1)
@@ -0,0 +1,206 @@
+import logging
+from typing import Dict, List, Tuple, Union
+from hashlib import sha256
+from os import makedirs, path, replace, getpid, walk
+import json
+import subprocess
+from shutil import which
+from threading import Lock
+from time import perf_counter
+
+# the MiniZinc options that change the flattening of an instance; the first
+# ones take a value (as the next argument, after '=' or, for the short ones,
+# attached to the option, as the level of -O is):
+flattening_value_options = ['-D', '--cmdline-data', '-d', '--data', '-I',
+                            '--search-dir', '-G', '--globals-dir',
+                            '--mzn-globals-dir', '--stdlib-dir',
+                            '--output-mode']
+flattening_switches = ['--no-optimize', '--no-optimise', '--two-pass',
+                       '--use-gecode', '--sac', '--shave',
+                       '--only-range-domains', '--no-half-reifications',
+                       '--no-chain-compression', '--output-objective',
+                       '--allow-multiple-assignments']
+
+
+def split_flags(flags: List[str]) -> Tuple[List[str], List[str]]:
+    # the (flattening, solving) flags of a MiniZinc command line:
+    flattening, solving = [], []
+    i = 0
+    while i < len(flags):
+        flag = flags[i]
+        name = flag.split('=', 1)[0]
+        if flag in flattening_value_options:
+            flattening += flags[i:i + 2]
+            i += 2
+            continue
+        attached = any(len(o) == 2 and flag.startswith(o) and len(flag) > 2
+                       for o in flattening_value_options + ['-O'])
+        if (attached or flag in flattening_switches or
+                (name != flag and name in flattening_value_options)):
+            flattening.append(flag)
+        else:
+            solving.append(flag)
+        i += 1
+    return flattening, solving
+
+
+class FlatZincCache:
+    cache_dir: str = None
+    minizinc_path: str = None
+    minizinc_version: str = None
+    # solver configuration file -> the digest of its library:
+    library_digests: Dict[str, str] = None
+    locks: Dict[str, Lock] = None
+    locks_lock: Lock = None
+
+    def __init__(self, cache_dir: str, minizinc_path: str = None):
+        self.cache_dir = path.abspath(cache_dir)
+        self.minizinc_path = (minizinc_path if minizinc_path is not None
+                              else which('minizinc'))
+        self.minizinc_version = None
+        self.library_digests = dict()
+        self.locks = dict()
+        self.locks_lock = Lock()
+        makedirs(self.cache_dir, exist_ok=True)
+
+    def version(self) -> str:
+        # flattening depends on the MiniZinc version as well:
+        if self.minizinc_version is None:
+            process = subprocess.run([self.minizinc_path, '--version'],
+                                     stdout=subprocess.PIPE,
+                                     stderr=subprocess.DEVNULL)
+            self.minizinc_version = process.stdout.decode('utf-8').strip()
+        return self.minizinc_version
+
+    def stdlib_dir(self) -> Union[None, str]:
+        process = subprocess.run([self.minizinc_path, '--config-dirs'],
+                                 stdout=subprocess.PIPE,
+                                 stderr=subprocess.DEVNULL)
+        try:
+            return json.loads(process.stdout.decode('utf-8')).get(
+                'mznStdlibDir')
+        except ValueError:
+            return None
+
+    def library_dir(self, solver: str) -> Union[None, str]:
+        # the mznlib directory of the solver configuration file, relative to
+        # it or (with -G) to the standard library:
+        try:
+            with open(solver, 'r') as f:
+                mznlib = json.load(f).get('mznlib')
+        except (OSError, ValueError, AttributeError):
+            return None
+        if not isinstance(mznlib, str) or len(mznlib) == 0:
+            return None
+        if mznlib.startswith('-G'):
+            stdlib = self.stdlib_dir()
+            return None if stdlib is None else path.join(stdlib, mznlib[2:])
+        return path.join(path.dirname(path.abspath(solver)),
+                         path.expanduser(mznlib))
+
+    def library_digest(self, solver: str) -> str:
+        # the models include the library of the solver (e.g. gecode.mzn), so
+        # its files are part of the key; they are hashed once per cache, as
+        # the library does not change during a campaign:
+        if solver not in self.library_digests:
+            h = sha256()
+            library = self.library_dir(solver)
+            if library is not None and path.isdir(library):
+                for root, dirs, files in walk(library):
+                    dirs.sort()
+                    for name in sorted(files):
+                        file_path = path.join(root, name)
+                        h.update(path.relpath(file_path, library).encode(
+                            'utf-8') + b'\0')
+                        with open(file_path, 'rb') as f:
+                            for chunk in iter(lambda: f.read(1 << 20), b''):
+                                h.update(chunk)
+                        h.update(b'\0')
+            self.library_digests[solver] = h.hexdigest()
+        return self.library_digests[solver]
+
+    def key(self, model: str, data_file: str, solver: str,
+            flags: List[str]) -> str:
+        h = sha256()
+        for file_path in (model, data_file):
+            with open(file_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    h.update(chunk)
+            h.update(b'\0')
+        # the solver is identified by its configuration file and library (or
+        # by its identifier when it is not a file):
+        if path.isfile(solver):
+            with open(solver, 'rb') as f:
+                h.update(f.read())
+            h.update(b'\0')
+            h.update(self.library_digest(solver).encode('utf-8'))
+        else:
+            h.update(solver.encode('utf-8'))
+        h.update(b'\0')
+        h.update('\0'.join(flags).encode('utf-8'))
+        h.update(b'\0')
+        h.update(self.version().encode('utf-8'))
+        return h.hexdigest()
+
+    def paths(self, key: str) -> Tuple[str, str]:
+        prefix = path.join(self.cache_dir, key[:2], key)
+        return f'{prefix}.fzn', f'{prefix}.ozn'
+
+    @staticmethod
+    def time_path(fzn_path: str) -> str:
+        # the flattening time (in seconds) of a cache entry:
+        return path.splitext(fzn_path)[0] + '.time'
+
+    def flat_time(self, fzn_path: str) -> Union[None, float]:
+        try:
+            with open(self.time_path(fzn_path), 'r') as f:
+                return float(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def lock(self, key: str) -> Lock:
+        with self.locks_lock:
+            if key not in self.locks:
+                self.locks[key] = Lock()
+            return self.locks[key]
+
+    def compile(self, model: str, data_file: str, solver: str,
+                flags: Union[None, List[str]] = None
+                ) -> Union[None, Tuple[str, str, Union[None, float]]]:
+        # flags are the flattening flags (see split_flags); returns the
+        # FlatZinc and output files and the time (in seconds) it took to
+        # flatten the instance (None for entries cached without it):
+        flags = [] if flags is None else flags
+        key = self.key(model, data_file, solver, flags)
+        fzn_path, ozn_path = self.paths(key)
+        # only one thread flattens a given instance; the others wait for it
+        # and then reuse the cached files:
+        with self.lock(key):
+            if path.isfile(fzn_path) and path.isfile(ozn_path):
+                return fzn_path, ozn_path, self.flat_time(fzn_path)
+            makedirs(path.dirname(fzn_path), exist_ok=True)
+            tmp_fzn = f'{fzn_path}.{getpid()}.tmp'
+            tmp_ozn = f'{ozn_path}.{getpid()}.tmp'
+            args = [self.minizinc_path,
+                    '-c', model,
+                    '-d', data_file,
+                    '--solver', solver,
+                    '--fzn', tmp_fzn,
+                    '--ozn', tmp_ozn] + flags
+            logging.info(f'Flattening {path.basename(model)} with ' +
+                         path.basename(data_file))
+            start = perf_counter()
+            process = subprocess.run(args, stdout=subprocess.DEVNULL,
+                                     stderr=subprocess.PIPE)
+            flat_time = perf_counter() - start
+            if process.returncode != 0 or not path.isfile(tmp_fzn):
+                logging.warning(f'Flattening {path.basename(data_file)} '
+                                'failed: ' + process.stderr.decode('utf-8'))
+                return None
+            # the .fzn is moved last, as its existence marks a complete entry
+            # for other processes sharing the cache:
+            with open(self.time_path(fzn_path), 'w') as f:
+                f.write(f'{flat_time:.3f}')
+            replace(tmp_ozn, ozn_path)
+            replace(tmp_fzn, fzn_path)
+        return fzn_path, ozn_path, flat_time
@@ -0,0 +1,108 @@
+import logging
+from typing import Dict, List, Union
+from os import listdir, path, sysconf
+from shutil import which
+import asyncio
+
+page_size = sysconf('SC_PAGE_SIZE')
+
+
+def mem_available() -> Union[None, int]:
+    # the memory (in bytes) available for new processes without swapping:
+    try:
+        with open('/proc/meminfo', 'r') as meminfo:
+            for line in meminfo:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def group_rss() -> Dict[int, int]:
+    # process group id -> resident set size (in bytes) of its processes:
+    rss = dict()
+    for pid in listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(path.join('/proc', pid, 'stat'), 'r') as stat:
+                # the fields following the command name, which may contain
+                # spaces; pgrp is the 5th field and rss the 24th:
+                fields = stat.read().rsplit(')', 1)[1].split()
+            pgrp, pages = int(fields[2]), int(fields[21])
+        except (OSError, ValueError, IndexError):
+            continue
+        rss[pgrp] = rss.get(pgrp, 0) + pages * page_size
+    return rss
+
+
+def limit_memory(limit: int) -> List[str]:
+    # the command prefix that limits the address space (in bytes) of the
+    # command before it executes, so that the solver processes it starts
+    # inherit the limit:
+    prlimit = which('prlimit')
+    if prlimit is None:
+        logging.warning('prlimit not found: not limiting the memory.')
+        return []
+    return [prlimit, f'--as={limit}', '--']
+
+
+def expected_footprints(data_files: List[str], peak_rss: Dict[str, int],
+                        default: int = 0) -> Dict[str, int]:
+    # data file -> the largest peak rss (in bytes) of its earlier runs; without
+    # history, the largest peak of the other instances is expected:
+    fallback = max(peak_rss.values(), default=default)
+    return {df: peak_rss.get(path.splitext(path.basename(df))[0], fallback)
+            for df in data_files}
+
+
+class AdmissionController:
+    # the memory (in bytes) that must remain available after a new run has
+    # reached its expected footprint:
+    reserve: int = 0
+    # seconds between two checks of the available memory:
+    interval: float = 1.0
+    # process group id -> expected footprint (in bytes) of the running runs:
+    running: Dict[int, int] = None
+
+    def __init__(self, reserve: int, interval: float = 1.0):
+        self.reserve = reserve
+        self.interval = interval
+        self.running = dict()
+
+    def headroom(self) -> Union[None, int]:
+        available = mem_available()
+        if available is None:
+            return None
+        # the running runs that have not yet reached their expected footprint
+        # will take more of the available memory:
+        rss = group_rss() if len(self.running) > 0 else dict()
+        growth = sum(max(0, footprint - rss.get(pgrp, 0))
+                     for pgrp, footprint in self.running.items())
+        return available - growth - self.reserve
+
+    async def admit(self, footprint: int) -> None:
+        waited = False
+        while True:
+            headroom = self.headroom()
+            if headroom is None or headroom >= footprint:
+                break
+            if len(self.running) == 0:
+                logging.warning(f'Only {headroom // 2**20} MiB of memory '
+                                'available above the reserve; starting the '
+                                f'run, expected to use {footprint // 2**20} '
+                                'MiB, anyway.')
+                break
+            if not waited:
+                logging.info(f'Waiting for memory: {footprint // 2**20} MiB '
+                             f'expected, {max(0, headroom) // 2**20} MiB '
+                             'available.')
+                waited = True
+            await asyncio.sleep(self.interval)
+
+    def started(self, pid: int, footprint: int) -> None:
+        self.running[pid] = footprint
+
+    def finished(self, pid: int) -> None:
+        self.running.pop(pid, None)
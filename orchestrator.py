@@ -0,0 +1,247 @@
+import logging
+from typing import Callable, Coroutine, Dict, Iterable, List, Set, Union
+import os
+from os import killpg
+import asyncio
+import re
+import signal
+import subprocess
+import sys
+from affinity import pin
+from memory import AdmissionController, limit_memory
+
+# the longest line of solver output (e.g. a solution array) that is read:
+line_limit = 1 << 26
+
+# the errors of solvers that ran out of memory (e.g. under their memory
+# limit):
+out_of_memory_re = re.compile(r'bad_alloc|out of memory|Cannot allocate '
+                              r'memory|MemoryError', re.IGNORECASE)
+
+
+def rusage_dict(rusage) -> Dict[str, Union[int, float]]:
+    # the resources used by the process and the processes it waited for
+    # (the solver started by minizinc); maxrss is in KiB:
+    return {'utime': round(rusage.ru_utime, 3),
+            'stime': round(rusage.ru_stime, 3),
+            'maxrss': rusage.ru_maxrss,
+            'nvcsw': rusage.ru_nvcsw,
+            'nivcsw': rusage.ru_nivcsw,
+            'majflt': rusage.ru_majflt}
+
+
+class ProcessResult:
+    # False if the process was not started or did not finish by itself
+    # (deadline or kill_all):
+    finished: bool = False
+    returncode: Union[None, int] = None
+    rusage: Union[None, Dict[str, Union[int, float]]] = None
+    # the process reported running out of memory, or was killed by SIGKILL
+    # (e.g. by the OOM killer) other than by the orchestrator:
+    out_of_memory: bool = False
+    # the process was stopped early (with stop) and counts as finished:
+    stopped: bool = False
+
+    def __init__(self, finished: bool, returncode: Union[None, int] = None,
+                 rusage: Union[None, Dict[str, Union[int, float]]] = None,
+                 out_of_memory: bool = False, stopped: bool = False):
+        self.finished = finished
+        self.returncode = returncode
+        self.rusage = rusage
+        self.out_of_memory = out_of_memory
+        self.stopped = stopped
+
+
+def wrap(args: List[str], core: Union[None, int],
+         memory_limit: Union[None, int]) -> List[str]:
+    # the command, pinned and limited by commands that execute it (no Python
+    # code runs in the child between fork and exec, which could deadlock
+    # with the threads of the event loop), so that every process of the run
+    # inherits the affinity and the limit:
+    prefix = []
+    if core is not None:
+        prefix += pin(core)
+    if memory_limit is not None:
+        prefix += limit_memory(memory_limit)
+    return prefix + list(args)
+
+
+def kill_group(process: subprocess.Popen) -> None:
+    # the solver runs in its own session, so its process group (with the same
+    # id as its pid) holds minizinc and every solver process it started:
+    try:
+        killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+class Orchestrator:
+    # the number of tasks that run at the same time:
+    concurrency: int = 1
+    semaphore: asyncio.Semaphore = None
+    processes: Set[subprocess.Popen] = None
+    # the pids of the processes that were killed for exceeding a deadline:
+    overruns: Set[int] = None
+    # the pids of the processes that were stopped because they were done:
+    stops: Set[int] = None
+    killed: bool = False
+    admission: Union[None, AdmissionController] = None
+
+    def __init__(self, concurrency: int,
+                 admission: Union[None, AdmissionController] = None):
+        self.concurrency = max(1, concurrency)
+        self.admission = admission
+        self.semaphore = None
+        self.processes = set()
+        self.overruns = set()
+        self.stops = set()
+        self.killed = False
+
+    async def run(self, args,
+                  on_line: Union[None, Callable[[str], None]] = None,
+                  deadline: Union[None, float] = None,
+                  on_start: Union[None, Callable[[int], None]] = None,
+                  memory_limit: Union[None, int] = None,
+                  footprint: int = 0,
+                  core: Union[None, int] = None) -> ProcessResult:
+        # runs the process, passing each line of its output to on_line, and
+        # kills its process group when it overruns its deadline (in seconds);
+        # the address space of the process is limited to memory_limit bytes
+        # and, with admission control, it is only started once its expected
+        # footprint (in bytes) fits in the available memory. The process is
+        # pinned to core (if any) and limited before it executes:
+        if self.killed:
+            return ProcessResult(False)
+        if self.admission is not None:
+            await self.admission.admit(footprint)
+            if self.killed:
+                return ProcessResult(False)
+        loop = asyncio.get_running_loop()
+        # the process is reaped with wait4 (instead of by asyncio's child
+        # watcher, which discards the resource usage), so it is started with
+        # Popen and only its output pipes are handed to the event loop:
+        process = subprocess.Popen(wrap(args, core, memory_limit),
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE,
+                                   start_new_session=True)
+        self.processes.add(process)
+        if self.admission is not None:
+            self.admission.started(process.pid, footprint)
+        stdout = asyncio.StreamReader(limit=line_limit)
+        transport, _ = await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(stdout), process.stdout)
+        stderr = asyncio.StreamReader(limit=line_limit)
+        error_transport, _ = await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(stderr), process.stderr)
+        errors = loop.create_task(self.forward_errors(stderr))
+        if on_start is not None:
+            on_start(process.pid)
+        timer = None
+        if deadline is not None:
+            timer = loop.call_later(deadline, self.overrun, process)
+        try:
+            async for line in stdout:
+                if on_line is not None:
+                    on_line(line.decode('utf-8'))
+            rusage = await self.wait(process)
+        finally:
+            if timer is not None:
+                timer.cancel()
+            # solver processes left behind by the process are killed as well:
+            kill_group(process)
+            if process.returncode is None:
+                rusage = await self.wait(process)
+            transport.close()
+            if self.admission is not None:
+                self.admission.finished(process.pid)
+            self.processes.discard(process)
+        # the stderr pipe is closed once the process group is gone:
+        try:
+            out_of_memory = await asyncio.wait_for(errors, 1)
+        except asyncio.TimeoutError:
+            out_of_memory = False
+        error_transport.close()
+        overrun = process.pid in self.overruns
+        self.overruns.discard(process.pid)
+        stopped = process.pid in self.stops
+        self.stops.discard(process.pid)
+        finished = not (overrun or self.killed)
+        out_of_memory = out_of_memory or (
+            finished and not stopped and
+            process.returncode == -signal.SIGKILL)
+        return ProcessResult(finished, process.returncode,
+                             rusage_dict(rusage), out_of_memory, stopped)
+
+    async def forward_errors(self, stderr: asyncio.StreamReader) -> bool:
+        # passes the error output of the process on to stderr; returns True if
+        # it reported running out of memory:
+        out_of_memory = False
+        async for line in stderr:
+            sys.stderr.buffer.write(line)
+            sys.stderr.buffer.flush()
+            if out_of_memory_re.search(line.decode('utf-8', 'replace')):
+                out_of_memory = True
+        return out_of_memory
+
+    async def wait(self, process: subprocess.Popen):
+        # the resource usage of the process once it has exited:
+        if hasattr(os, 'pidfd_open'):
+            loop = asyncio.get_running_loop()
+            exited = loop.create_future()
+            pidfd = os.pidfd_open(process.pid)
+            loop.add_reader(pidfd, lambda: exited.done() or
+                            exited.set_result(None))
+            try:
+                await exited
+            finally:
+                loop.remove_reader(pidfd)
+                os.close(pidfd)
+            _, status, rusage = os.wait4(process.pid, 0)
+        else:
+            _, status, rusage = await asyncio.to_thread(
+                os.wait4, process.pid, 0)
+        # Popen must not wait for the pid again, as it may have been reused:
+        process.returncode = os.waitstatus_to_exitcode(status)
+        return rusage
+
+    def overrun(self, process: subprocess.Popen) -> None:
+        if process.returncode is None:
+            logging.warning(f'Deadline exceeded: killing process {process.pid}')
+            self.overruns.add(process.pid)
+            kill_group(process)
+
+    def stop(self, pid: int) -> None:
+        # ends a run that has nothing left to do (e.g. it reached a known
+        # optimum); unlike an overrun, the run counts as finished:
+        process = next((p for p in self.processes if p.pid == pid), None)
+        if process is not None and process.returncode is None:
+            self.stops.add(pid)
+            kill_group(process)
+
+    def kill_all(self) -> None:
+        if not self.killed:
+            logging.warning('KILLED: killing all solver processes...')
+        self.killed = True
+        for process in list(self.processes):
+            kill_group(process)
+
+    async def limited(self, coroutine: Coroutine) -> None:
+        async with self.semaphore:
+            if self.killed:
+                coroutine.close()
+                return
+            await coroutine
+
+    async def gather(self, coroutines: Iterable[Coroutine]) -> None:
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, self.kill_all)
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        await asyncio.gather(*(self.limited(c) for c in coroutines),
+                             return_exceptions=True)
+
+    def run_all(self, coroutines: Iterable[Coroutine]) -> bool:
+        # runs the tasks from one event loop, at most concurrency at a time;
+        # returns False if they were interrupted:
+        asyncio.run(self.gather(coroutines))
+        return not self.killed
@@ -0,0 +1,181 @@
+import logging
+from typing import Dict, List, Tuple, Union
+from os import path
+from shutil import rmtree
+from tempfile import mkdtemp
+from time import perf_counter
+import asyncio
+import json
+import re
+from run import MiniZincRunner, SolutionStream
+from orchestrator import ProcessResult
+from result_store import to_int
+
+# the data parameter that the warm start of a model is read from, e.g.
+# solve :: lns_warm_start(pred ++ arrival, solution):
+warm_start_re = re.compile(r'array\s*\[\s*int\s*\]\s*of\s*int\s*:\s*'
+                           r'solution\s*;')
+solution_assignment_re = re.compile(r'^\s*solution\s*=\s*\[.*?\]\s*;',
+                                    re.MULTILINE | re.DOTALL)
+
+# the rusage entries that are summed over the runs of a portfolio (maxrss is
+# the largest of them):
+summed_rusage_keys = ['utime', 'stime', 'nvcsw', 'nivcsw', 'majflt']
+
+
+def has_warm_start(model: str) -> bool:
+    with open(model, 'r') as model_file:
+        return warm_start_re.search(model_file.read()) is not None
+
+
+def write_seed(data_file: str, solution: str, seed_path: str) -> None:
+    # the data file with its solution (the warm start) replaced:
+    if data_file.lower().endswith('.json'):
+        with open(data_file, 'r') as input:
+            data = json.load(input)
+        data['solution'] = json.loads(solution)
+        with open(seed_path, 'w') as output:
+            json.dump(data, output)
+        return
+    with open(data_file, 'r') as input:
+        text = input.read()
+    assignment = f'solution = {solution};'
+    text, num_replaced = solution_assignment_re.subn(
+        lambda _: assignment, text, count=1)
+    if num_replaced == 0:
+        text += '\n' + assignment + '\n'
+    with open(seed_path, 'w') as output:
+        output.write(text)
+
+
+class PortfolioRunner(MiniZincRunner):
+    # the asset types (members) solve an instance together in rounds: every
+    # round, each member runs on its own core from the best solution found so
+    # far, which is passed to the next round through the solution data
+    # parameter (the warm start) of the model. A portfolio run is recorded as
+    # one run of results/<model>.txt-portfolio:
+    members: List[MiniZincRunner] = []
+    rounds: int = 10
+
+    def __init__(self, solver_path, model, output_path, time_limit, extra,
+                 members: List[MiniZincRunner], rounds: int = 10, **kwargs):
+        super().__init__(solver_path, model, output_path, time_limit, extra,
+                         **kwargs)
+        self.members = members
+        self.rounds = max(1, rounds)
+
+    @staticmethod
+    def member_name(member: MiniZincRunner) -> str:
+        return member.output_path.rsplit('-', 1)[-1]
+
+    async def run_member(self, member: MiniZincRunner, seed_file: str,
+                         instance: str, footprint: int
+                         ) -> Union[None, Tuple[SolutionStream, float,
+                                                ProcessResult]]:
+        args = await member.arguments(seed_file)
+        if args is None:
+            return None
+        core = None if self.cores is None else await self.cores.acquire()
+        try:
+            return await member.solve(args, core, footprint, instance)
+        finally:
+            if core is not None:
+                self.cores.release(core)
+
+    async def run_dzn(self, data_file: str, run_index: int) -> None:
+        if not self.should_run(data_file, run_index, True):
+            return
+        work_dir = mkdtemp(prefix='portfolio-')
+        try:
+            await self.run_rounds(data_file, work_dir)
+        finally:
+            rmtree(work_dir, ignore_errors=True)
+
+    async def run_rounds(self, data_file: str, work_dir: str) -> None:
+        instance = self.file_name(data_file)
+        start = perf_counter()
+        best = SolutionStream(self, start)
+        maximise = False
+        extras: Dict[str, Union[int, float, str]] = dict()
+        statistics: Dict[str, float] = dict()
+        seed_file = data_file
+        num_rounds = 0
+        for r in range(self.rounds):
+            results = await asyncio.gather(*(
+                self.run_member(m, seed_file, instance,
+                                self.footprints.get(data_file, 0))
+                for m in self.members))
+            if self.orchestrator.killed:
+                logging.warning("KILLED: quitting without storing results.")
+                return
+            num_rounds += 1
+            # the solutions of the round, in the order they were found:
+            points = []
+            for member, result in zip(self.members, results):
+                if result is None:
+                    continue
+                stream, _, process_result = result
+                for k in summed_rusage_keys:
+                    extras[k] = round(extras.get(k, 0) +
+                                      process_result.rusage[k], 3)
+                extras['maxrss'] = max(extras.get('maxrss', 0),
+                                       process_result.rusage['maxrss'])
+                for k, v in stream.statistics.items():
+                    statistics[k] = statistics.get(k, 0) + float(v)
+                if process_result.out_of_memory:
+                    logging.warning(f'MEMOUT; {instance}; round {r + 1}; '
+                                    f'{self.member_name(member)}')
+                    extras['memout'] = 'true'
+                    best.error = True
+                    continue
+                if process_result.stopped:
+                    extras['stopped'] = 'optimum'
+                best.error = best.error or stream.error
+                best.optimal = best.optimal or stream.optimal
+                if r == 0 and best.initial_objective is None:
+                    best.initial_objective = stream.initial_objective
+                    maximise = (to_int(stream.initial_objective) is not None
+                                and to_int(stream.objective) is not None and
+                                to_int(stream.objective) >
+                                to_int(stream.initial_objective))
+                offset = int(round((stream.start - start) * 1000))
+                # only the final incumbent of the member has its solution:
+                points += [(ms + offset, to_int(o),
+                            stream.solution if i + 1 == len(stream.trajectory)
+                            else None)
+                           for i, (ms, o) in enumerate(stream.trajectory)]
+            improved = False
+            for point in sorted(points, key=lambda p: p[0]):
+                objective = point[1]
+                if objective is None:
+                    continue
+                current = to_int(best.objective)
+                if current is None or (objective > current if maximise
+                                       else objective < current):
+                    best.objective = str(objective)
+                    best.trajectory.append((point[0], str(objective)))
+                    improved = True
+                if point[2] is not None and best.objective == str(objective):
+                    best.solution = point[2]
+            logging.info(f'Portfolio; {instance}; round {r + 1}/'
+                         f'{self.rounds}; objective: {best.objective}')
+            if best.optimal:
+                break
+            if improved and best.solution is not None:
+                seed_file = path.join(work_dir, f'{instance}-{r + 1}' +
+                                      path.splitext(data_file)[1])
+                write_seed(data_file, best.solution, seed_file)
+        duration = perf_counter() - start
+
+        if self.solution_store is not None and best.solution is not None:
+            best.solution = self.solution_store.put(best.solution)
+
+        extras.update({k: round(v, 3) if k.endswith('Time') else int(v)
+                       for k, v in statistics.items()})
+        extras['portfolio'] = '+'.join(self.member_name(m)
+                                       for m in self.members)
+        extras['rounds'] = num_rounds
+        if self.store is not None:
+            self.store_run(instance, best, duration, extras)
+        else:
+            self.write_run(instance, best, duration, extras)
@@ -0,0 +1,193 @@
+import logging
+from typing import Dict, List, Set, Tuple, Union
+from itertools import combinations
+from math import comb, erfc, inf, sqrt
+from statistics import median
+import json
+from result_store import result_key
+from to_json import parse_extras, reached_time_limit
+
+# pooled samples with at most this many splits are tested exactly:
+exact_limit = 20000
+
+
+def midranks(values: List[float]) -> List[float]:
+    # the (1-based) ranks of the values; tied values share their mean rank:
+    order = sorted(range(len(values)), key=lambda i: values[i])
+    ranks = [0.0] * len(values)
+    i = 0
+    while i < len(order):
+        j = i
+        while j + 1 < len(order) and values[order[j + 1]] == values[order[i]]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[order[k]] = (i + j) / 2 + 1
+        i = j + 1
+    return ranks
+
+
+def mann_whitney_u(xs: List[float], ys: List[float]) -> Tuple[float, float]:
+    # the one-sided Mann-Whitney U test of whether the xs tend to be smaller
+    # than the ys; returns (U, p), where U counts the pairs with x < y (ties
+    # count half). Small samples are tested exactly, by enumerating every
+    # split of the pooled ranks, and larger ones with the normal
+    # approximation (with tie correction):
+    n1, n2 = len(xs), len(ys)
+    if n1 == 0 or n2 == 0:
+        return 0.0, 1.0
+    ranks = midranks(list(xs) + list(ys))
+
+    def smaller(rank_sum: float) -> float:
+        return n1 * n2 - (rank_sum - n1 * (n1 + 1) / 2)
+
+    u = smaller(sum(ranks[:n1]))
+    n = n1 + n2
+    if comb(n, n1) <= exact_limit:
+        num_splits = 0
+        num_extreme = 0
+        for split in combinations(ranks, n1):
+            num_splits += 1
+            if smaller(sum(split)) >= u - 1e-9:
+                num_extreme += 1
+        return u, num_extreme / num_splits
+    ties: Dict[float, int] = dict()
+    for r in ranks:
+        ties[r] = ties.get(r, 0) + 1
+    variance = n1 * n2 / 12 * (
+        (n + 1) - sum(t ** 3 - t for t in ties.values()) / (n * (n - 1)))
+    if variance <= 0:
+        return u, 1.0
+    z = (u - n1 * n2 / 2 - 0.5) / sqrt(variance)
+    return u, 0.5 * erfc(z / sqrt(2))
+
+
+def recorded_objectives(runner) -> Dict[str, List[Tuple[Union[None, int],
+                                                        Union[None, int]]]]:
+    # instance -> (objective, initial objective) of each recorded run of the
+    # runner, except the budget runs that were stopped by the time limit:
+    objectives = dict()
+    if runner.store is not None:
+        model, method = result_key(runner.output_path)
+        for (_, m, instance, objective, _, _, initial_objective,
+             extras) in runner.store.runs(model):
+            if m == method and not reached_time_limit(
+                    dict() if extras is None else json.loads(extras)):
+                objectives.setdefault(instance, []).append(
+                    (objective, initial_objective))
+        return objectives
+    if not runner.output_file_exists():
+        return objectives
+    with open(runner.output_path, 'r') as output_file:
+        for line in output_file:
+            entries = [e.strip() for e in line.split('\t', 5)]
+            if len(entries) < 5 or reached_time_limit(
+                    parse_extras(line.split('\t')[6:])):
+                continue
+            values = []
+            for entry in (entries[1], entries[4]):
+                try:
+                    values.append(int(entry))
+                except ValueError:
+                    values.append(None)
+            objectives.setdefault(entries[0], []).append(tuple(values))
+    return objectives
+
+
+class Race:
+    # the asset types (runners) of a model race on each instance, or on the
+    # model as a whole; after every batch of repetitions, the asset types
+    # that are significantly worse than the leader are no longer run:
+    runners: List = None
+    data_files: List[str] = None
+    num_runs: int = 5
+    batch: int = 5
+    alpha: float = 0.05
+    by: str = 'instance'
+    # (runner output path, instance or None for the whole model) pairs that
+    # are no longer run:
+    pruned: Set[Tuple[str, Union[None, str]]] = None
+
+    def __init__(self, runners: List, data_files: List[str], num_runs: int,
+                 batch: int = 5, alpha: float = 0.05, by: str = 'instance'):
+        self.runners = runners
+        self.data_files = data_files
+        self.num_runs = num_runs
+        self.batch = max(1, batch)
+        self.alpha = alpha
+        self.by = by
+        self.pruned = set()
+
+    def is_pruned(self, runner, data_file: str) -> bool:
+        return ((runner.output_path, None) in self.pruned or
+                (runner.output_path, runner.file_name(data_file))
+                in self.pruned)
+
+    def targets(self) -> List[int]:
+        # the number of repetitions after each batch:
+        return list(range(self.batch, self.num_runs, self.batch)) + \
+            [self.num_runs]
+
+    def tasks(self, target: int) -> List:
+        return [(mr, df, ri)
+                for mr in self.runners
+                for df in self.data_files
+                if not self.is_pruned(mr, df)
+                for ri in range(target)
+                if mr.should_run(df, ri, False)]
+
+    def samples(self) -> Dict[Union[None, str], Dict[str, List[float]]]:
+        # group -> runner output path -> the values of its runs, the lower the
+        # better; a run without a solution is worse than every solution. On a
+        # whole model, the values are the relative gaps to the best objective
+        # of the instance, so that the instances are comparable:
+        instances = [self.runners[0].file_name(df) for df in self.data_files]
+        runs = {mr.output_path: recorded_objectives(mr)
+                for mr in self.runners}
+        samples = dict()
+        for instance in instances:
+            objectives = [o for r in runs.values()
+                          for o, _ in r.get(instance, []) if o is not None]
+            initial = [i for r in runs.values()
+                       for _, i in r.get(instance, []) if i is not None]
+            # the objective improves away from the initial objective
+            # (all models of this repository minimise):
+            maximise = (len(initial) > 0 and len(objectives) > 0 and
+                        max(objectives) > min(initial))
+            sign = -1 if maximise else 1
+            best = min((sign * o for o in objectives), default=None)
+            group = instance if self.by == 'instance' else None
+            for mr in self.runners:
+                if (mr.output_path, group) in self.pruned:
+                    continue
+                values = samples.setdefault(group, dict()).setdefault(
+                    mr.output_path, [])
+                for o, _ in runs[mr.output_path].get(instance, []):
+                    if o is None:
+                        values.append(inf)
+                    elif self.by == 'instance':
+                        values.append(sign * o)
+                    else:
+                        values.append((sign * o - best) /
+                                      max(1, abs(best)))
+        return samples
+
+    def prune(self) -> None:
+        names = {mr.output_path: mr.output_path.rsplit('-', 1)[-1]
+                 for mr in self.runners}
+        for group, values in self.samples().items():
+            contenders = {p: vs for p, vs in values.items() if len(vs) > 0}
+            if len(contenders) < 2:
+                continue
+            leader = min(contenders, key=lambda p: (
+                median(contenders[p]),
+                sum(contenders[p]) / len(contenders[p])))
+            for p, vs in contenders.items():
+                if p == leader:
+                    continue
+                _, p_value = mann_whitney_u(contenders[leader], vs)
+                if p_value < self.alpha:
+                    self.pruned.add((p, group))
+                    logging.info(
+                        f'Race: {group or "all instances"}: pruning '
+                        f'{names[p]} after {len(vs)} runs (p = '
+                        f'{p_value:.4f} against {names[leader]})')
@@ -0,0 +1,283 @@
+import logging
+from typing import Any, Dict, Iterator, List, Tuple, Union
+from argparse import ArgumentParser
+from fnmatch import fnmatchcase
+from glob import glob
+from os import path
+from threading import local
+import json
+import sqlite3
+from time import time
+from to_json import parse_extras, parse_trajectory, trajectory_path
+
+
+schema = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    model TEXT NOT NULL,
+    method TEXT NOT NULL,
+    instance TEXT NOT NULL,
+    objective INTEGER,
+    time INTEGER,
+    error INTEGER NOT NULL DEFAULT 0,
+    initial_objective INTEGER,
+    extras TEXT,
+    created REAL
+);
+CREATE INDEX IF NOT EXISTS runs_model_instance_method
+    ON runs (model, instance, method);
+CREATE INDEX IF NOT EXISTS runs_model_method
+    ON runs (model, method);
+CREATE TABLE IF NOT EXISTS trajectories (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    time INTEGER NOT NULL,
+    objective INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS trajectories_run ON trajectories (run_id);
+CREATE TABLE IF NOT EXISTS solutions (
+    run_id INTEGER PRIMARY KEY REFERENCES runs (id) ON DELETE CASCADE,
+    solution TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS aggregates (
+    name TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    created REAL
+);
+'''
+
+
+def result_key(output_path: str) -> Tuple[str, str]:
+    # results/<model>.txt-<method> -> (<model>, <method>):
+    fname, ext = path.splitext(path.basename(output_path))
+    return fname, ext.lstrip('.').lstrip('txt').lstrip('-')
+
+
+def to_int(s: str) -> Union[None, int]:
+    try:
+        return int(s)
+    except (TypeError, ValueError):
+        return None
+
+
+class ResultStore:
+    db_path: str = None
+    connections: local = None
+
+    def __init__(self, db_path: str):
+        self.db_path = path.abspath(db_path)
+        self.connections = local()
+        with self.connection() as conn:
+            conn.executescript(schema)
+
+    def connection(self) -> sqlite3.Connection:
+        # sqlite connections cannot be shared between threads:
+        conn = getattr(self.connections, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=60)
+            # WAL lets several processes (and hosts on shared storage that
+            # support it) append runs while others read:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self.connections.conn = conn
+        return conn
+
+    def add_run(self, model: str, method: str, instance: str,
+                objective: Union[None, int], time_ms: Union[None, int],
+                error: bool, initial_objective: Union[None, int],
+                solution: Union[None, str],
+                extras: Union[None, Dict[str, Any]] = None,
+                trajectory: Union[None, List[Tuple[int, int]]] = None) -> int:
+        conn = self.connection()
+        with conn:
+            return self.insert_run(conn, model, method, instance, objective,
+                                   time_ms, error, initial_objective,
+                                   solution, extras, trajectory)
+
+    @staticmethod
+    def insert_run(conn: sqlite3.Connection, model: str, method: str,
+                   instance: str, objective: Union[None, int],
+                   time_ms: Union[None, int], error: bool,
+                   initial_objective: Union[None, int],
+                   solution: Union[None, str],
+                   extras: Union[None, Dict[str, Any]],
+                   trajectory: Union[None, List[Tuple[int, int]]]) -> int:
+        cursor = conn.execute(
+            'INSERT INTO runs (model, method, instance, objective, time, '
+            'error, initial_objective, extras, created) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (model, method, instance, objective, time_ms, int(error),
+             initial_objective,
+             None if extras is None else json.dumps(extras), time()))
+        run_id = cursor.lastrowid
+        if solution is not None:
+            conn.execute('INSERT INTO solutions (run_id, solution) '
+                         'VALUES (?, ?)', (run_id, solution))
+        if trajectory is not None:
+            conn.executemany(
+                'INSERT INTO trajectories (run_id, time, objective) '
+                'VALUES (?, ?, ?)',
+                [(run_id, t, o) for t, o in trajectory])
+        return run_id
+
+    def counts(self, model: str, method: str) -> Dict[str, int]:
+        rows = self.connection().execute(
+            'SELECT instance, COUNT(*) FROM runs WHERE model = ? AND '
+            'method = ? GROUP BY instance', (model, method))
+        return {instance: count for instance, count in rows}
+
+    def models(self, patterns: Union[None, List[str]] = None) -> List[str]:
+        rows = self.connection().execute(
+            'SELECT DISTINCT model FROM runs ORDER BY model')
+        models = [m for m, in rows]
+        if patterns is None:
+            return models
+        return [m for m in models
+                if any(fnmatchcase(m, p) for p in patterns)]
+
+    def runs(self, model: str) -> Iterator[Tuple]:
+        # (id, method, instance, objective, time, error, initial_objective,
+        # extras) in insertion order; solutions are not read:
+        return self.connection().execute(
+            'SELECT id, method, instance, objective, time, error, '
+            'initial_objective, extras FROM runs WHERE model = ? '
+            'ORDER BY id', (model,))
+
+    def trajectories(self, model: str) -> Dict[int, List[Tuple[int, int]]]:
+        rows = self.connection().execute(
+            'SELECT t.run_id, t.time, t.objective FROM trajectories t '
+            'JOIN runs r ON r.id = t.run_id WHERE r.model = ? '
+            'ORDER BY t.run_id, t.time', (model,))
+        trajectories = dict()
+        for run_id, t, o in rows:
+            trajectories.setdefault(run_id, []).append((t, o))
+        return trajectories
+
+    def times(self, model: str) -> Dict[str, List[int]]:
+        # the recorded times (in milliseconds) of every instance of the model:
+        rows = self.connection().execute(
+            'SELECT instance, time FROM runs WHERE model = ? AND time IS NOT '
+            'NULL ORDER BY id', (model,))
+        times = dict()
+        for instance, t in rows:
+            times.setdefault(instance, []).append(t)
+        return times
+
+    def peak_rss(self, model: str) -> Dict[str, int]:
+        # the largest recorded maxrss (in KiB) of every instance of the model:
+        rows = self.connection().execute(
+            "SELECT instance, MAX(CAST(json_extract(extras, '$.maxrss') AS "
+            "INTEGER)) FROM runs WHERE model = ? AND extras IS NOT NULL "
+            "GROUP BY instance", (model,))
+        return {instance: peak for instance, peak in rows
+                if peak is not None}
+
+    def solution(self, run_id: int) -> Union[None, str]:
+        row = self.connection().execute(
+            'SELECT solution FROM solutions WHERE run_id = ?',
+            (run_id,)).fetchone()
+        return None if row is None else row[0]
+
+    def put_aggregate(self, name: str, data: Dict[str, Any]) -> None:
+        conn = self.connection()
+        with conn:
+            conn.execute('INSERT OR REPLACE INTO aggregates (name, data, '
+                         'created) VALUES (?, ?, ?)',
+                         (name, json.dumps(data), time()))
+
+    def aggregates(self, patterns: Union[None, List[str]] = None
+                   ) -> List[Tuple[str, Dict[str, Any]]]:
+        rows = self.connection().execute(
+            'SELECT name, data FROM aggregates ORDER BY name')
+        return [(name, json.loads(data)) for name, data in rows
+                if patterns is None or
+                any(fnmatchcase(name, p) for p in patterns)]
+
+    def import_file(self, txt_file: str) -> int:
+        # only the runs of an instance beyond those already in the store are
+        # imported, so importing a growing file again is safe:
+        model, method = result_key(txt_file)
+        counts = self.counts(model, method)
+        trajectories: Dict[str, List[List[Tuple[int, int]]]] = dict()
+        trajectory_file = trajectory_path(txt_file)
+        if path.isfile(trajectory_file):
+            with open(trajectory_file, 'r') as input:
+                for line in input:
+                    entries = [e.strip() for e in line.split('\t')]
+                    if len(entries) < 2:
+                        continue
+                    trajectories.setdefault(entries[0], []).append(
+                        parse_trajectory(entries[1]))
+        lines: Dict[str, List[List[str]]] = dict()
+        with open(txt_file, 'r') as input:
+            for line in input:
+                entries = [e.strip() for e in line.split('\t')]
+                if len(entries) < 4:
+                    continue
+                lines.setdefault(entries[0], []).append(entries)
+        num_imported = 0
+        conn = self.connection()
+        with conn:
+            num_imported = self.import_lines(conn, model, method, counts,
+                                             lines, trajectories)
+        return num_imported
+
+    def import_lines(self, conn: sqlite3.Connection, model: str, method: str,
+                     counts: Dict[str, int],
+                     lines: Dict[str, List[List[str]]],
+                     trajectories: Dict[str, List[List[Tuple[int, int]]]]
+                     ) -> int:
+        num_imported = 0
+        for instance, instance_lines in lines.items():
+            # trajectories belong to the most recent runs of an instance:
+            instance_trajectories = trajectories.get(instance, [])
+            offset = len(instance_lines) - len(instance_trajectories)
+            for i, entries in enumerate(instance_lines):
+                if i < counts.get(instance, 0):
+                    continue
+                trajectory = (instance_trajectories[i - offset]
+                              if 0 <= i - offset < len(instance_trajectories)
+                              else None)
+                extras = parse_extras(entries[6:])
+                self.insert_run(
+                    conn, model, method, instance,
+                    to_int(entries[1]), to_int(entries[2]),
+                    entries[3].lower() != 'false',
+                    to_int(entries[4]) if len(entries) > 4 else None,
+                    (entries[5] if len(entries) > 5 and entries[5] != '--'
+                     else None),
+                    extras if len(extras) > 0 else None,
+                    trajectory)
+                num_imported += 1
+        return num_imported
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+
+    parser.add_argument('--db', dest='db', metavar='<results>.sqlite',
+                        type=str, required=True,
+                        help='the SQLite result store.')
+
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = subparsers.add_parser(
+        'import', help='import results/<model>.txt-<method> files (and '
+        'their trajectories) into the store.')
+    import_parser.add_argument(dest='data_files',
+                               metavar='<data file>.txt[-*]', nargs='+',
+                               type=str, help='txt result files.')
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    store = ResultStore(args.db)
+
+    if args.command == 'import':
+        data_files = sorted({fp for glob_list in args.data_files
+                             for fp in glob(glob_list)})
+        for data_file in data_files:
+            num_imported = store.import_file(data_file)
+            logging.info(f'{path.basename(data_file)}: imported '
+                         f'{num_imported} runs')
@@ -1,45 +1,253 @@
 import logging
-from typing import List, Union
+from typing import Any, Dict, List, Tuple, Union
 from argparse import ArgumentParser, ArgumentTypeError, REMAINDER
 from glob import glob
-from os import path
-import subprocess
+from os import makedirs, path, replace, stat
 from shutil import which
 from time import perf_counter
-from concurrent.futures import ThreadPoolExecutor
 from threading import Lock
+import asyncio
 import re
+import json
 from sys import exc_info
+from to_json import trajectory_path
+from fzn_cache import FlatZincCache, split_flags
+from solver_arguments import (minizinc_arguments, objective_re,
+                              search_limit_flags)
+from orchestrator import Orchestrator, ProcessResult
+from schedule import expected_durations, historical_peak_rss
+from affinity import (CorePool, available_cpus, numa_cpus, parse_cpu_list,
+                      physical_cores)
+from result_store import ResultStore, result_key, to_int
+from solution_store import SolutionStore
+from memory import AdmissionController, expected_footprints
+from budget import Budget, budget_statistics, format_budget, load_budget
+from racing import Race
+from adaptive import AdaptiveRepetitions
+from best_known import Registry
+
+
+class SolutionStream:
+    separator: str = '----------'
+    objective: Union[None, str] = None
+    initial_objective: Union[None, str] = None
+    solution: Union[None, str] = None
+    optimal: bool = False
+    unknown: bool = False
+    error: bool = False
+    num_lines: int = 0
+    pending: Dict[str, str] = None
+    # (milliseconds since start, objective) of every improving solution:
+    trajectory: List[Tuple[int, str]] = None
+    # the last value of each recorded %%%mzn-stat statistic:
+    statistics: Dict[str, str] = None
+
+    def __init__(self, runner, start: float):
+        self.runner = runner
+        self.start = start
+        self.trajectory = []
+        self.statistics = dict()
+        self.objective = None
+        self.initial_objective = None
+        self.solution = None
+        self.optimal = False
+        self.unknown = False
+        self.error = False
+        self.num_lines = 0
+        # the fields of the solution block currently being printed:
+        self.pending = dict()
+
+    def is_empty(self) -> bool:
+        return self.num_lines == 0
+
+    def feed(self, line: str) -> None:
+        line = line.strip()
+        if len(line) == 0:
+            return
+        statistic = self.runner.statistic(line)
+        if statistic is not None:
+            self.statistics[statistic[0]] = statistic[1]
+            return
+        self.num_lines += 1
+        if line == self.separator:
+            self.commit()
+            return
+        if self.runner.is_optimal(line):
+            self.optimal = True
+        if self.runner.is_unknown(line):
+            self.unknown = True
+        if self.runner.has_error(line):
+            self.error = True
+        for field, parse in (('solution', self.runner.solution),
+                             ('initial_objective',
+                              self.runner.initial_objective),
+                             ('objective', self.runner.objective)):
+            value = parse(line)
+            if value is not None:
+                self.pending[field] = value
+                return
+
+    def commit(self) -> None:
+        # a solution block is complete; it replaces the incumbent, but fields
+        # it does not print are kept from earlier blocks (a block that is cut
+        # off before its separator is never committed):
+        for field, value in self.pending.items():
+            setattr(self, field, value)
+        if 'objective' in self.pending:
+            ms = int(round((perf_counter() - self.start) * 1000))
+            self.trajectory.append((ms, self.pending['objective']))
+        self.pending = dict()
+
+
+class ResultIndex:
+    output_path: str = None
+    sidecar_path: Union[str, None] = None
+    store: Union[None, ResultStore] = None
+    # instance name -> number of runs in the output file:
+    counts: Dict[str, int] = None
+
+    def __init__(self, output_path: str, use_sidecar: bool = False,
+                 store: Union[None, ResultStore] = None):
+        self.output_path = output_path
+        self.sidecar_path = None
+        self.store = store
+        if use_sidecar and store is None:
+            self.sidecar_path = path.join(
+                path.dirname(output_path),
+                '.' + path.basename(output_path) + '.index')
+        self.counts = self.load()
+
+    def output_size(self) -> int:
+        if not path.isfile(self.output_path):
+            return 0
+        return stat(self.output_path).st_size
+
+    def load(self) -> Dict[str, int]:
+        if self.store is not None:
+            return self.store.counts(*result_key(self.output_path))
+        if not path.isfile(self.output_path):
+            return dict()
+        size = self.output_size()
+        # the sidecar is only trusted if the output file has not changed size
+        # since the sidecar was written:
+        if self.sidecar_path is not None and path.isfile(self.sidecar_path):
+            try:
+                with open(self.sidecar_path, 'r') as sidecar_file:
+                    sidecar = json.load(sidecar_file)
+                if sidecar['size'] == size:
+                    return {k: int(v) for k, v in sidecar['counts'].items()}
+            except (ValueError, KeyError, TypeError, AttributeError):
+                logging.warning(f'ignoring corrupt {self.sidecar_path}')
+        counts = self.scan()
+        self.counts = counts
+        self.save()
+        return counts
+
+    def scan(self) -> Dict[str, int]:
+        counts = dict()
+        with open(self.output_path, 'r') as output_file:
+            for line in output_file:
+                entries = line.lstrip().split('\t', 1)
+                if len(entries) < 2:
+                    continue
+                counts[entries[0]] = counts.get(entries[0], 0) + 1
+        return counts
+
+    def save(self) -> None:
+        if self.sidecar_path is None:
+            return
+        tmp_path = self.sidecar_path + '.tmp'
+        with open(tmp_path, 'w') as sidecar_file:
+            json.dump({'size': self.output_size(), 'counts': self.counts},
+                      sidecar_file)
+        replace(tmp_path, self.sidecar_path)
+
+    def count(self, instance: str) -> int:
+        return self.counts.get(instance, 0)
+
+    def add(self, instance: str) -> None:
+        self.counts[instance] = self.count(instance) + 1
+        self.save()
 
 
 class MiniZincRunner:
     model: str = None
     output_path: str = None
+    trajectory_path: str = None
     extra: List[str] = []
     time_limit: int = None
     data: List[str] = []
     minizinc_path: str
     solver: str = 'Dexter'
     file_lock: None
-    kill: bool = False
+    index: ResultIndex = None
+    fzn_cache: Union[None, FlatZincCache] = None
+    # data file -> the time (in seconds) it took to flatten its cached
+    # FlatZinc:
+    flat_times: Dict[str, float] = None
+    orchestrator: Orchestrator = None
+    # milliseconds past the time limit before a run is killed:
+    grace: int = 10000
+    cores: Union[None, CorePool] = None
+    store: Union[None, ResultStore] = None
+    solution_store: Union[None, SolutionStore] = None
+    statistics: bool = False
+    # the address space limit (in bytes) of a run:
+    memory_limit: Union[None, int] = None
+    # data file -> the expected peak memory (in bytes) of a run:
+    footprints: Dict[str, int] = None
+    # instance -> the deterministic (fail or node) budget of its runs:
+    budget: Union[None, Dict[str, Budget]] = None
+    # the best known objectives and bounds; a run is stopped once its
+    # incumbent is proven optimal by a registered bound:
+    best_known: Union[None, Registry] = None
 
     unknown_re = re.compile(r'=====UNKNOWN=====')
     optimal_re = re.compile(r'==========')
     error_re = re.compile(r'=====ERROR=====')
-    objective_re = re.compile(r'^\s*objective\s*=\s*(\d+)')
+    objective_re = objective_re
     solution_re = re.compile(r'^\s*solution\s*=\s(.*);')
     initial_objective_re = re.compile(r'^\s*initialObjective\s*=\s*(\d+)')
+    statistic_re = re.compile(r'^%%%mzn-stat:\s*(\w+)\s*=\s*(\S+)')
+    # the statistics printed with --statistics that are stored with a run:
+    statistic_keys = ['nodes', 'failures', 'propagations', 'restarts',
+                      'flatTime', 'solveTime']
 
-    def __init__(self, solver_path, model, output_path, time_limit, extra):
+    def __init__(self, solver_path, model, output_path, time_limit, extra,
+                 index_sidecar: bool = False,
+                 fzn_cache: Union[None, FlatZincCache] = None,
+                 orchestrator: Union[None, Orchestrator] = None,
+                 grace: int = 10000,
+                 cores: Union[None, CorePool] = None,
+                 store: Union[None, ResultStore] = None,
+                 solution_store: Union[None, SolutionStore] = None,
+                 statistics: bool = False,
+                 memory_limit: Union[None, int] = None,
+                 budget: Union[None, Dict[str, Budget]] = None,
+                 best_known: Union[None, Registry] = None):
         if path.exists(solver_path):
             self.solver = solver_path
         self.model = model
         self.output_path = output_path
+        self.trajectory_path = trajectory_path(output_path)
         self.time_limit = time_limit
         self.extra = extra
         self.minizinc_path = which('minizinc')
         self.file_lock = Lock()
-        self.kill = False
+        self.index = ResultIndex(output_path, index_sidecar, store)
+        self.fzn_cache = fzn_cache
+        self.flat_times = dict()
+        self.orchestrator = (orchestrator if orchestrator is not None
+                             else Orchestrator(1))
+        self.grace = grace
+        self.cores = cores
+        self.store = store
+        self.solution_store = solution_store
+        self.statistics = statistics
+        self.memory_limit = memory_limit
+        self.footprints = dict()
+        self.budget = budget
+        self.best_known = best_known
 
     def output_file_exists(self) -> bool:
         return path.exists(self.output_path)
@@ -74,8 +282,16 @@ class MiniZincRunner:
             return None
         return match.group(1)
 
-    def time(self, output, duration: float) -> str:
-        if self.is_timeout(output):
+    def statistic(self, output: str) -> Union[None, Tuple[str, str]]:
+        match = self.statistic_re.search(output)
+        if match is None or match.group(1) not in self.statistic_keys:
+            return None
+        return match.group(1), match.group(2)
+
+    def time(self, is_optimal: bool, duration: float) -> str:
+        # runs with a budget end when the budget is spent, not at the time
+        # limit:
+        if not is_optimal and self.budget is None:
             return str(self.time_limit)
         return str(int(round(duration * 1000)))
 
@@ -84,123 +300,503 @@ class MiniZincRunner:
 
     def should_run(self, data_file: str, run_index: int,
                    requires_lock: bool) -> bool:
-        if not path.exists(self.output_path):
-            return True
-        if not path.isfile(self.output_path):
-            return True
-        num_matches = 0
-        file_name = self.file_name(data_file) + '\t'
         if requires_lock:
             self.file_lock.acquire()
         try:
-            with open(self.output_path, 'r') as output_file:
-                for line in output_file.readlines():
-                    if line.lstrip().startswith(file_name):
-                        num_matches += 1
+            num_matches = self.index.count(self.file_name(data_file))
         finally:
             if requires_lock:
                 self.file_lock.release()
         return run_index >= num_matches
 
-    def run_dzn(self, data_file: str, run_index: int) -> None:
-        if not self.should_run(data_file, run_index, True):
-            return
+    def statistics_flags(self) -> List[str]:
+        return ['-s', '--output-time'] if self.statistics else []
 
-        args = [self.minizinc_path,
-                self.model,
-                '--solver', self.solver,
-                '-d', data_file,
-                '--time-limit', str(self.time_limit)] + self.extra
-        start = perf_counter()
-        process = subprocess.Popen(args, stdout=subprocess.PIPE)
+    def budget_flags(self, data_file: str) -> List[str]:
+        if self.budget is None:
+            return []
+        kind, limit = self.budget[self.file_name(data_file)]
+        return search_limit_flags(**{f'{kind}_limit': limit})
 
+    def reached_time_limit(self, data_file: str, stream: SolutionStream,
+                           duration: float) -> bool:
+        # a run with a budget that was stopped by the time limit (only a
+        # safety limit) before it spent its budget; without statistics, a run
+        # that lasted until the time limit is assumed to have been stopped by
+        # it:
+        if self.budget is None or stream.optimal:
+            return False
+        kind, limit = self.budget[self.file_name(data_file)]
         try:
-            stdout, stderr = process.communicate()
-        except subprocess.TimeoutExpired:
+            return float(stream.statistics[budget_statistics[kind]]) < limit
+        except (KeyError, ValueError):
+            return duration * 1000 >= self.time_limit
+
+    async def arguments(self, data_file: str) -> Union[None, List[str]]:
+        if self.fzn_cache is None:
+            return minizinc_arguments(
+                self.minizinc_path, self.model, self.solver, data_file,
+                self.time_limit, self.statistics_flags() +
+                self.budget_flags(data_file) + self.extra)
+        # the instance is flattened once (before the timer starts) and the
+        # solver is run on the cached FlatZinc; the extra flags that change
+        # the flattening are passed to the compilation (and are part of the
+        # cache key) instead:
+        flattening, solving = split_flags(self.extra)
+        compiled = await asyncio.to_thread(
+            self.fzn_cache.compile, self.model, data_file, self.solver,
+            flattening)
+        if compiled is None:
+            return None
+        fzn_path, ozn_path, flat_time = compiled
+        if flat_time is not None:
+            self.flat_times[data_file] = flat_time
+        return [self.minizinc_path,
+                '--solver', self.solver,
+                fzn_path,
+                '--ozn-file', ozn_path,
+                '--time-limit', str(self.time_limit)] + \
+            self.statistics_flags() + self.budget_flags(data_file) + solving
+
+    async def solve(self, args: List[str], core: Union[None, int],
+                    footprint: int = 0, instance: Union[None, str] = None
+                    ) -> Union[None, Tuple[SolutionStream, float,
+                                           ProcessResult]]:
+        # only the incumbent is kept; earlier solutions are discarded as soon
+        # as an improving solution has been printed:
+        stream = SolutionStream(self, perf_counter())
+        pids = []
+
+        def on_start(pid: int) -> None:
+            # the run may have waited for memory before it was started:
+            stream.start = perf_counter()
+            pids.append(pid)
+
+        def on_line(line: str) -> None:
+            objective = stream.objective
+            stream.feed(line)
+            if (self.best_known is None or stream.optimal or
+                    stream.objective == objective or len(pids) == 0):
+                return
+            if self.best_known.is_optimal(instance, to_int(stream.objective)):
+                # the incumbent reached the registered bound:
+                logging.info(f'OPTIMAL; {instance}; objective: '
+                             f'{stream.objective} reached the known bound')
+                stream.optimal = True
+                self.orchestrator.stop(pids[0])
+
+        result = await self.orchestrator.run(
+            args, on_line, (self.time_limit + self.grace) / 1000,
+            on_start, self.memory_limit, footprint, core)
+
+        if self.orchestrator.killed:
+            logging.warning("KILLED: quitting without storing results.")
+            return None
+
+        if not result.finished:
             logging.warning("Timeout: quitting without storing results.")
+            return None
+
+        return stream, perf_counter() - stream.start, result
+
+    async def run_dzn(self, data_file: str, run_index: int) -> None:
+        if not self.should_run(data_file, run_index, True):
             return
 
-        if self.kill:
-            logging.warning("KILLED: quitting without storing results.")
+        if (self.budget is not None and
+                self.file_name(data_file) not in self.budget):
+            logging.warning(f'{path.basename(data_file)}: no budget; '
+                            'skipping.')
+            return
+
+        args = await self.arguments(data_file)
+        if args is None:
+            return
+
+        core = None if self.cores is None else await self.cores.acquire()
+        try:
+            result = await self.solve(args, core,
+                                      self.footprints.get(data_file, 0),
+                                      self.file_name(data_file))
+        finally:
+            if core is not None:
+                self.cores.release(core)
+        if result is None:
             return
+        stream, duration, process_result = result
 
-        duration = perf_counter() - start
+        if self.fzn_cache is not None and 'solveTime' in stream.statistics:
+            # the run on cached FlatZinc does not flatten, so its time is
+            # the search time (without the startup of MiniZinc):
+            try:
+                duration = float(stream.statistics['solveTime'])
+            except ValueError:
+                pass
 
-        if stderr is not None:
-            logging.warning(stderr.decode('utf-8'))
+        if process_result.out_of_memory:
+            # the run is recorded (with the incumbent it found), so that it is
+            # not mistaken for a run that was lost:
+            logging.warning(f'MEMOUT; {path.basename(data_file)}; extra: ' +
+                            ' '.join(self.extra))
+            stream.error = True
 
-        output = stdout.decode('utf-8')
-        
         ms = int(duration * 1000)
 
-        if not self.is_optimal(output) and ms < self.time_limit:
+        if not stream.optimal and ms < self.time_limit:
             logging.info(f'UNKNOWN; {path.basename(data_file)}; ' +
-                         f'is optimal: {self.is_optimal(output)}; ' +
-                         f'is_unknown: {self.is_unknown(output)}; ' +
+                         f'is optimal: {stream.optimal}; ' +
+                         f'is_unknown: {stream.unknown}; ' +
                          f'duration: {int(round(duration * 1000))}; ' +
                          '; extra: ' + ' '.join(self.extra))
 
-        solutions = output.split('\n----------\n')
-        solutions = [s.strip() for s in solutions if len(s.strip()) > 0]
-        if len(solutions) == 0:
+        if stream.is_empty() and not process_result.out_of_memory:
             return
 
-        # the best solution is at the end
-        solutions.reverse()
+        file_name = self.file_name(data_file)
 
-        solution = None
-        initial_objective = None
-        objective = None
+        if self.solution_store is not None and stream.solution is not None:
+            # the run only keeps a reference to the stored solution:
+            stream.solution = self.solution_store.put(stream.solution)
 
-        def is_done():
-            return (solution is not None and initial_objective is not None and
-                    objective is not None)
+        # the key=value columns of the run:
+        extras = dict()
+        if core is not None:
+            extras['core'] = core
+        extras.update(process_result.rusage)
+        extras.update(stream.statistics)
+        if self.statistics and data_file in self.flat_times:
+            # MiniZinc does not report the flattening of cached FlatZinc, so
+            # the flattening of the cache entry is recorded:
+            extras['flatTime'] = round(self.flat_times[data_file], 3)
+        if process_result.out_of_memory:
+            extras['memout'] = 'true'
+        if process_result.stopped:
+            extras['stopped'] = 'optimum'
+        if self.budget is not None:
+            extras['budget'] = format_budget(
+                self.budget[self.file_name(data_file)])
+            if self.reached_time_limit(data_file, stream, duration):
+                # the run is not deterministic and is not reported with the
+                # runs that spent their budget:
+                logging.warning(f'{path.basename(data_file)}: the time limit '
+                                'was reached before the budget was spent.')
+                extras['limit'] = 'time'
 
-        for sol in solutions:
-            if is_done():
-                break
-            for line in sol.splitlines():
-                if is_done():
-                    break
-                if solution is None:
-                    tmp = self.solution(line)
-                    if tmp is not None:
-                        solution = tmp
-                        continue
-                if initial_objective is None:
-                    tmp = self.initial_objective(line)
-                    if tmp is not None:
-                        initial_objective = tmp
-                        continue
-                if objective is None:
-                    tmp = self.objective(line)
-                    if tmp is not None:
-                        objective = tmp
-                        continue
-
-        solution = solution if solution is not None else '--'
-        initial_objective = (initial_objective if initial_objective is not None
-                             else '--')
-        objective = objective if objective is not None else '--'
+        if self.store is not None:
+            self.store_run(file_name, stream, duration, extras)
+        else:
+            self.write_run(file_name, stream, duration, extras)
 
-        file_name = self.file_name(data_file)
+    def store_run(self, file_name: str, stream: SolutionStream,
+                  duration: float, extras: Dict[str, Any]) -> None:
+        model, method = result_key(self.output_path)
+        self.file_lock.acquire()
+        try:
+            self.store.add_run(
+                model, method, file_name,
+                to_int(stream.objective),
+                int(self.time(stream.optimal, duration)),
+                stream.error,
+                to_int(stream.initial_objective),
+                stream.solution,
+                extras if len(extras) > 0 else None,
+                [(ms, int(obj)) for ms, obj in stream.trajectory])
+            self.index.add(file_name)
+        finally:
+            self.file_lock.release()
+
+    def write_run(self, file_name: str, stream: SolutionStream,
+                  duration: float, extras: Dict[str, Any]) -> None:
+        solution = stream.solution if stream.solution is not None else '--'
+        initial_objective = (stream.initial_objective
+                             if stream.initial_objective is not None
+                             else '--')
+        objective = stream.objective if stream.objective is not None else '--'
 
         output_line = '\t'.join(s for s in [
             file_name,
             objective,
-            self.time(output, duration),
-            str(self.has_error(output)).lower(),
+            self.time(stream.optimal, duration),
+            str(stream.error).lower(),
             initial_objective,
-            solution]) + '\n'
+            solution] + [f'{k}={v}' for k, v in extras.items()]) + '\n'
 
+        trajectory_line = '\t'.join([
+            file_name,
+            ' '.join(f'{ms}:{obj}' for ms, obj in stream.trajectory)]) + '\n'
+
+        # the trajectory is written under the same lock, so that the k-th
+        # trajectory of an instance belongs to its k-th recorded run:
         self.file_lock.acquire()
         try:
             with open(self.output_path, 'a') as output_file:
                 output_file.write(output_line)
+            self.index.add(file_name)
+            makedirs(path.dirname(self.trajectory_path), exist_ok=True)
+            with open(self.trajectory_path, 'a') as trajectory_file:
+                trajectory_file.write(trajectory_line)
         finally:
             self.file_lock.release()
 
 
+# enumeration of the PBS asset type:
+# 0 = branch and bound asset;
+# 1 = random lns asset;
+# 2 = propagation guided lns asset;
+# 3 = cost impact guided lns asset;
+# 4 = objective relaxation lns asset;
+# 5 = static variable dependency lns asset;
+# 6 = reversed propagation guided lns asset;
+# 7 = prioritized branching bab asset;
+# 8 = branch and bound opposite branching asset;
+# 9 = shaving asset;
+# -1 = run multiple assets"
+
+curated_lns_asset_types = {
+    'random',
+    'pg',
+    'ci',
+    'vrg',
+    'rpg'
+}
+
+lns_asset_types = [
+    (1, "random"),
+    (2, "pg"),
+    (3, "ci"),
+    # (4, "or"),  # not an automated selection heuristic
+    (5, "vrg"),
+    (6, "rpg")
+]
+
+Task = Tuple[MiniZincRunner, str, int]
+
+
+def expand_data_files(patterns: List[str]) -> List[str]:
+    data_files = []
+    seen_data_files = set()
+    for data_file in (fp for glob_list in patterns
+                      for fp in glob(glob_list)):
+        if data_file in seen_data_files:
+            continue
+        data_files.append(data_file)
+        seen_data_files.add(data_file)
+    return list(sorted(data_files))
+
+
+def lns_runners(solver: str, model: str, output: str, time_limit: int,
+                extra: List[str], curated_lns: bool,
+                asset_types: Union[None, List[str]] = None,
+                **kwargs) -> List[MiniZincRunner]:
+    types = lns_asset_types
+    if curated_lns:
+        types = [(i, s) for i, s in types if s in curated_lns_asset_types]
+    if asset_types is not None:
+        types = [(i, s) for i, s in types if s in asset_types]
+    return [MiniZincRunner(solver,
+                           model,
+                           f'{output}-{s}',
+                           time_limit,
+                           extra + ['--pbs-asset-type', str(a)],
+                           **kwargs)
+            for a, s in types]
+
+
+def pending_tasks(runners: List[MiniZincRunner], data_files: List[str],
+                  num_runs: int) -> List[Task]:
+    return [(mr, df, ri)
+            for mr in runners
+            for df in data_files
+            for ri in range(num_runs)
+            if mr.should_run(df, ri, False)]
+
+
+def order_tasks(tasks: List[Task], schedule: str) -> List[Task]:
+    if schedule != 'longest-first':
+        return tasks
+    # long instances are started first, so that the campaign does not end
+    # with a few long runs on otherwise idle workers:
+    durations = dict()
+    data_files = dict()
+    for mr, df, _ in tasks:
+        data_files.setdefault(mr.model, set()).add(df)
+    for model, model_data_files in data_files.items():
+        model_runners = [mr for mr, _, _ in tasks if mr.model == model]
+        output_paths = [mr.output_path for mr in model_runners]
+        # with --db, the history is in the store instead of the result files:
+        store = next((mr.store for mr in model_runners
+                      if mr.store is not None), None)
+        recorded = (None if store is None else
+                    store.times(result_key(model_runners[0].output_path)[0]))
+        for df, d in expected_durations(list(sorted(model_data_files)),
+                                        output_paths, recorded).items():
+            durations[(model, df)] = d
+    return sorted(tasks, key=lambda t: (-durations[(t[0].model, t[1])], t[2]))
+
+
+def learn_footprints(tasks: List[Task]) -> None:
+    # the expected footprint of a run is the largest peak rss recorded for
+    # its instance by any asset type:
+    runners: Dict[str, List[MiniZincRunner]] = dict()
+    data_files: Dict[str, set] = dict()
+    for mr, df, _ in tasks:
+        runners.setdefault(mr.model, [])
+        if mr not in runners[mr.model]:
+            runners[mr.model].append(mr)
+        data_files.setdefault(mr.model, set()).add(df)
+    for model, model_runners in runners.items():
+        peak_rss = historical_peak_rss([mr.output_path
+                                        for mr in model_runners])
+        for mr in model_runners:
+            if mr.store is None:
+                continue
+            for i, p in mr.store.peak_rss(
+                    result_key(mr.output_path)[0]).items():
+                peak_rss[i] = max(p, peak_rss.get(i, 0))
+        default = model_runners[0].memory_limit or 0
+        footprints = expected_footprints(
+            list(sorted(data_files[model])),
+            {i: 1024 * p for i, p in peak_rss.items()}, default)
+        for mr in model_runners:
+            mr.footprints = footprints
+
+
+def worker_cores(cores: Union[None, str], numa_node: Union[None, int],
+                 workers: Union[None, int],
+                 pin_cores: bool) -> Tuple[int, Union[None, CorePool]]:
+    cpus = available_cpus()
+    if numa_node is not None:
+        cpus.intersection_update(numa_cpus(numa_node))
+    cpu_list = (physical_cores(cpus) if cores is None
+                else [c for c in parse_cpu_list(cores) if c in cpus])
+    if len(cpu_list) == 0:
+        raise ValueError('No cores available.')
+    num_workers = len(cpu_list) if workers is None else workers
+    if not pin_cores:
+        return num_workers, None
+    if num_workers > len(cpu_list):
+        logging.warning(f'Only {len(cpu_list)} cores to pin {num_workers} '
+                        f'workers to; using {len(cpu_list)} workers.')
+        num_workers = len(cpu_list)
+    return num_workers, CorePool(cpu_list[:num_workers])
+
+
+def run_tasks(tasks: List[Task], orchestrator: Orchestrator) -> None:
+    async def run(mzn_runner: MiniZincRunner, data_file: str, ri: int,
+                  ti: int):
+        logging.info(f'Run {ti + 1}/{len(tasks)}; ' +
+                     f'{path.basename(data_file)}; extra: ' +
+                     ' '.join(mzn_runner.extra))
+        try:
+            await mzn_runner.run_dzn(data_file, ri)
+        except Exception as e:
+            exc_type, exc_obj, exc_tb = exc_info()
+            fname = path.split(exc_tb.tb_frame.f_code.co_filename)[1]
+            logging.warning(exc_type)
+            logging.warning(fname)
+            logging.warning(exc_tb.tb_lineno)
+            logging.warning(e)
+        finally:
+            pass
+
+    # every solver process is supervised from one event loop, so the number
+    # of workers is not bounded by threads:
+    if not orchestrator.run_all(run(*task, ti)
+                                for ti, task in enumerate(tasks)):
+        logging.warning("KILLED: DONE")
+        exit(1)
+
+
+def add_execution_arguments(parser: ArgumentParser) -> None:
+    # the arguments that are shared by run.py and campaign.py:
+    parser.add_argument('--index-sidecar', dest='index_sidecar',
+                        default=False, action='store_true',
+                        help='keep the number of completed runs per instance '
+                        'in a hidden .index file next to each output file, so '
+                        'that resuming does not rescan the output files.')
+
+    parser.add_argument('--fzn-cache', dest='fzn_cache',
+                        metavar='<cache directory>', type=str, default=None,
+                        help='flatten each model and data file pair once and '
+                        'keep the FlatZinc in this directory, keyed by the '
+                        'contents of the model, data and solver files; the '
+                        'solver is then run on the cached FlatZinc.')
+
+    parser.add_argument('--db', dest='db', metavar='<results>.sqlite',
+                        type=str, default=None,
+                        help='record the runs in this SQLite result store '
+                        'instead of the output files; the output file names '
+                        'still determine the model and method of the runs.')
+
+    parser.add_argument('--solution-store', dest='solution_store',
+                        metavar='<store directory>', type=str, default=None,
+                        help='store each distinct solution once, compressed, '
+                        'in this directory and record only its sha256 '
+                        'reference with the run.')
+
+    parser.add_argument('--statistics', dest='statistics', default=False,
+                        action='store_true',
+                        help='run MiniZinc with --statistics and '
+                        '--output-time and record the nodes, failures, '
+                        'propagations, restarts, flattening time and solve '
+                        'time of each run.')
+
+    parser.add_argument('--memory-limit', dest='memory_limit', type=int,
+                        default=None, metavar='<MiB>',
+                        help='limit the address space of each run (MiniZinc '
+                        'and its solver) to this many MiB; runs that run out '
+                        'of memory are recorded with memout=true.')
+
+    parser.add_argument('--memory-reserve', dest='memory_reserve', type=int,
+                        default=None, metavar='<MiB>',
+                        help='only start a run when the available memory, '
+                        'minus the expected peak memory of the runs in '
+                        'progress and of the new run (learned from the '
+                        'maxrss of earlier runs), stays above this many '
+                        'MiB.')
+
+    parser.add_argument('--grace', dest='grace', type=int, default=10000,
+                        help='the number of milliseconds past the time limit '
+                        'after which a run and all its solver processes are '
+                        'killed.')
+
+    parser.add_argument('--schedule', dest='schedule', type=str,
+                        default='input', choices=['input', 'longest-first'],
+                        help='the order of the runs: in input order (model, '
+                        'instance, run), or the instances with the longest '
+                        'expected duration first, estimated from the times '
+                        'in the output files or, without history, from the '
+                        'instance size.')
+
+    parser.add_argument('--workers', dest='workers', type=int, default=None,
+                        help='the number of runs to perform concurrently; '
+                        'defaults to the number of cores.')
+
+    parser.add_argument('--cores', dest='cores', type=str, default=None,
+                        metavar='<cpu list>',
+                        help='the cpus (e.g. 0-7,16-23) to run the solvers '
+                        'on; defaults to one cpu per physical core.')
+
+    parser.add_argument('--numa-node', dest='numa_node', type=int,
+                        default=None,
+                        help='only use the cores of this NUMA node.')
+
+    parser.add_argument('--no-pin', dest='pin', default=True,
+                        action='store_false',
+                        help='do not pin each solver process to its own '
+                        'core.')
+
+
+def memory_limit(args) -> Union[None, int]:
+    return None if args.memory_limit is None else args.memory_limit * 2**20
+
+
+def memory_admission(args) -> Union[None, AdmissionController]:
+    if args.memory_reserve is None:
+        return None
+    return AdmissionController(args.memory_reserve * 2**20)
+
+
 if __name__ == '__main__':
     def file_path(rel_path: str) -> None:
         abs_path = path.abspath(rel_path)
@@ -235,7 +831,7 @@ if __name__ == '__main__':
                         type=str, help='The path to the gecode LNS .msc file.')
 
     parser.add_argument(dest='model', metavar='<model>.mzn', type=file_path,
-                        help='The MiniZinc model file.')
+                        nargs='?', help='The MiniZinc model file.')
 
     parser.add_argument('-d', '--data', dest='data_files',
                         metavar='<data file>.{dzn, json}', nargs='*',
@@ -262,6 +858,102 @@ if __name__ == '__main__':
                         default=180000,
                         help='the time limit for MiniZinc in milliseconds')
 
+    parser.add_argument('--budget', dest='budget', metavar='<budget>.json',
+                        type=file_path, default=None,
+                        help='give each run the deterministic fail or node '
+                        'budget of its instance in this file (see budget.py) '
+                        'instead of stopping it at the time limit, which '
+                        'only remains a safety limit; the budget is recorded '
+                        'as budget=<fail|node>:<limit>.')
+
+    parser.add_argument('--best-known', dest='best_known',
+                        metavar='<registry>.json', type=file_path,
+                        default=None,
+                        help='stop a run once its incumbent reaches the '
+                        'bound of its instance in this registry of best '
+                        'known objectives and bounds (see best_known.py); '
+                        'such runs are recorded with stopped=optimum.')
+
+    add_execution_arguments(parser)
+
+    parser.add_argument('--race', dest='race', default=False,
+                        action='store_true',
+                        help='run the repetitions in batches and, after each '
+                        'batch, stop running the asset types whose objectives '
+                        'are significantly worse (one-sided Mann-Whitney U '
+                        'test) than those of the best asset type.')
+
+    parser.add_argument('--race-batch', dest='race_batch', type=int,
+                        default=5,
+                        help='the number of repetitions per batch of a race.')
+
+    parser.add_argument('--race-alpha', dest='race_alpha', type=float,
+                        default=0.05,
+                        help='the significance level at which an asset type '
+                        'is pruned from a race.')
+
+    parser.add_argument('--race-by', dest='race_by', type=str,
+                        default='instance', choices=['instance', 'model'],
+                        help='race the asset types on each instance, or on the '
+                        'model as a whole (comparing the relative gaps to the '
+                        'best objective of each instance).')
+
+    parser.add_argument('--adaptive-runs', dest='adaptive_runs',
+                        default=False, action='store_true',
+                        help='run each asset type and instance pair '
+                        '--min-runs times, and then again while the '
+                        'confidence interval of its mean objective is wider '
+                        'than --ci-width, up to --num-runs times.')
+
+    parser.add_argument('--min-runs', dest='min_runs', type=int, default=3,
+                        help='the number of runs of each asset type and '
+                        'instance pair before the adaptive mode decides on '
+                        'more runs.')
+
+    parser.add_argument('--ci-width', dest='ci_width', type=float,
+                        default=0.01,
+                        help='the largest width of the 95%% confidence '
+                        'interval of the mean objective, relative to the '
+                        'mean, at which the adaptive mode stops.')
+
+    parser.add_argument('--portfolio', dest='portfolio', default=False,
+                        action='store_true',
+                        help='run the asset types together on each instance, '
+                        'one core each, in rounds that start from the best '
+                        'solution of the previous round (through the '
+                        'solution data parameter of the model); the runs are '
+                        'recorded in <output file>-portfolio.')
+
+    parser.add_argument('--portfolio-rounds', dest='portfolio_rounds',
+                        type=int, default=10,
+                        help='the number of rounds the time limit of a '
+                        'portfolio run is split into.')
+
+    parser.add_argument('--calibrate', dest='calibrate', default=False,
+                        action='store_true',
+                        help='instead of running the model, run a fixed '
+                        'workload (jobshop orb01 and tsptw n100w120.001 with '
+                        'a fixed seed and node limit) at increasing numbers '
+                        'of concurrent runs and recommend the highest number '
+                        'of workers whose slowdown stays within the '
+                        'tolerance.')
+
+    parser.add_argument('--calibration-levels', dest='calibration_levels',
+                        type=int, nargs='*', default=None,
+                        metavar='<workers>',
+                        help='the numbers of concurrent runs to calibrate; '
+                        'defaults to 1, 2, 4, ... up to the number of '
+                        'cores.')
+
+    parser.add_argument('--calibration-nodes', dest='calibration_nodes',
+                        type=int, default=200000,
+                        help='the node limit of each calibration run.')
+
+    parser.add_argument('--tolerance', dest='tolerance', type=float,
+                        default=0.05,
+                        help='the tolerated slowdown of a calibration run '
+                        'relative to running alone, e.g. 0.05 for 5%%.')
+
     parser.add_argument('--extra', nargs=REMAINDER, dest='extra',
                         type=str,
                         help='The extra flags (with leading dashes) that are '
@@ -273,103 +965,146 @@ if __name__ == '__main__':
 
     logging.basicConfig(level=logging.INFO)
 
-    if args.data_files is None:
+    extra = [] if args.extra is None else args.extra
+
+    if args.calibrate and args.solver is None:
+        parser.error('--calibrate requires --solver.')
+
+    if args.calibrate:
+        from calibrate import Calibration, default_levels
+        try:
+            cpus = worker_cores(args.cores, args.numa_node, None, True)[1]
+        except ValueError as e:
+            logging.error(e)
+            exit(1)
+        calibration = Calibration(args.solver, cpus.cores, args.pin,
+                                  args.calibration_nodes,
+                                  tolerance=args.tolerance, extra=extra)
+        levels = (default_levels(len(cpus)) if args.calibration_levels is None
+                  else args.calibration_levels)
+        exit(0 if calibration.calibrate(levels) is not None else 1)
+
+    if args.model is None or args.data_files is None:
         exit(1)
 
-    data_files = []
-    seen_data_files = set()
-    for data_file in (fp for glob_list in args.data_files
-                      for fp in glob(glob_list)):
-        if data_file in seen_data_files:
-            continue
-        data_files.append(data_file)
-        seen_data_files.add(data_file)
-    data_files = list(sorted(data_files))
-
-    # enumeration of the PBS asset type:
-    # 0 = branch and bound asset;
-    # 1 = random lns asset;
-    # 2 = propagation guided lns asset;
-    # 3 = cost impact guided lns asset;
-    # 4 = objective relaxation lns asset;
-    # 5 = static variable dependency lns asset;
-    # 6 = reversed propagation guided lns asset;
-    # 7 = prioritized branching bab asset;
-    # 8 = branch and bound opposite branching asset;
-    # 9 = shaving asset;
-    # -1 = run multiple assets"
-
-    curated_lns_asset_types = {
-        'random',
-        'pg',
-        'ci',
-        'vrg',
-        'rpg'
-    }
-
-    lns_asset_types = [
-        (1, "random"),
-        (2, "pg"),
-        (3, "ci"),
-        # (4, "or"),  # not an automated selection heuristic
-        (5, "vrg"),
-        (6, "rpg")
-    ]
-
-    if args.curated_lns:
-        lns_asset_types = [
-            (i, s) for i, s in lns_asset_types if s in curated_lns_asset_types]
+    if sum([args.race, args.adaptive_runs, args.portfolio]) > 1:
+        parser.error('--race, --adaptive-runs and --portfolio cannot be '
+                     'combined.')
 
-    extra = [] if args.extra is None else args.extra
+    data_files = expand_data_files(args.data_files)
 
-    mzn_runners = [MiniZincRunner(args.solver,
-                                  args.model,
-                                  f'{args.output}-{s}',
-                                  args.time_limit,
-                                  extra + ['--pbs-asset-type', str(a)])
-                   for a, s in lns_asset_types]
+    fzn_cache = (None if args.fzn_cache is None
+                 else FlatZincCache(args.fzn_cache))
 
-    tasks = [(mi, di, ri)
-             for mi in range(len(mzn_runners))
-             for di in range(len(data_files))
-             for ri in range(args.num_runs)
-             if mzn_runners[mi].should_run(data_files[di], ri, False)]
+    store = None if args.db is None else ResultStore(args.db)
 
-    tasks = [(mi, di, ri, ti) for ti, (mi, di, ri) in enumerate(tasks)]
+    solution_store = (None if args.solution_store is None
+                      else SolutionStore(args.solution_store))
 
-    def run(mi: int, di: int, ri: int, ti: int):
-        if mzn_runners[mi].kill:
-            return
-        logging.info(f'Run {ti + 1}/{len(tasks)}; ' +
-                     f'{path.basename(data_files[di])}; extra: ' +
-                     ' '.join(mzn_runners[mi].extra))
-        try:
-            mzn_runners[mi].run_dzn(data_files[di], ri)
-        except Exception as e:
-            exc_type, exc_obj, exc_tb = exc_info()
-            fname = path.split(exc_tb.tb_frame.f_code.co_filename)[1]
-            logging.warning(exc_type)
-            logging.warning(fname)
-            logging.warning(exc_tb.tb_lineno)
-            logging.warning(e)
-        finally:
-            pass
+    try:
+        num_workers, core_pool = worker_cores(args.cores, args.numa_node,
+                                              args.workers, args.pin)
+    except ValueError as e:
+        logging.error(e)
+        exit(1)
+
+    orchestrator = Orchestrator(num_workers, memory_admission(args))
+
+    runner_kwargs = dict(orchestrator=orchestrator,
+                         grace=args.grace,
+                         cores=core_pool,
+                         statistics=args.statistics,
+                         memory_limit=memory_limit(args),
+                         budget=(None if args.budget is None
+                                 else load_budget(args.budget)),
+                         best_known=(None if args.best_known is None
+                                     else Registry(args.best_known)))
+
+    if args.portfolio:
+        from portfolio import PortfolioRunner, has_warm_start
+        if not has_warm_start(args.model):
+            logging.error(f'{path.basename(args.model)} has no solution data '
+                          'parameter to start a round from (array[int] of '
+                          'int: solution).')
+            exit(1)
+        # the data files of the members change every round, so their
+        # FlatZinc is not cached:
+        members = lns_runners(args.solver, args.model, args.output,
+                              args.time_limit // args.portfolio_rounds,
+                              extra, args.curated_lns, **runner_kwargs)
+        mzn_runners = [PortfolioRunner(
+            args.solver, args.model, f'{args.output}-portfolio',
+            args.time_limit, extra, members, args.portfolio_rounds,
+            index_sidecar=args.index_sidecar, store=store,
+            solution_store=solution_store, **runner_kwargs)]
+        # each instance takes one worker per member:
+        orchestrator.concurrency = max(1, num_workers // len(members))
+    else:
+        mzn_runners = lns_runners(args.solver, args.model, args.output,
+                                  args.time_limit, extra, args.curated_lns,
+                                  index_sidecar=args.index_sidecar,
+                                  fzn_cache=fzn_cache,
+                                  store=store,
+                                  solution_store=solution_store,
+                                  **runner_kwargs)
+
+    race = None
+    adaptive = None
+    if args.adaptive_runs:
+        adaptive = AdaptiveRepetitions(mzn_runners, data_files, args.min_runs,
+                                       args.num_runs, args.ci_width)
+    elif args.race:
+        race = Race(mzn_runners, data_files, args.num_runs, args.race_batch,
+                    args.race_alpha, args.race_by)
+        # the asset types that already lost on the recorded runs are not run:
+        race.prune()
+
+    if adaptive is not None:
+        tasks = adaptive.tasks()
+    elif race is not None:
+        tasks = race.tasks(race.targets()[0])
+    else:
+        tasks = pending_tasks(mzn_runners, data_files, args.num_runs)
+    tasks = order_tasks(tasks, args.schedule)
+
+    if args.memory_reserve is not None:
+        learn_footprints(tasks)
 
     logging.info(f'Model: {path.basename(args.model)}')
     logging.info(f'Time limit: {args.time_limit}')
     logging.info(f'Number of runs: {args.num_runs}')
     logging.info(f"Number of tasks: {len(tasks)}")
+    logging.info(f'Number of workers: {num_workers}')
+    if core_pool is not None:
+        logging.info('Cores: ' + ', '.join(map(str, core_pool.cores)))
 
-    with ThreadPoolExecutor(max_workers=16) as executor:
-        try:
-            for task in tasks:
-                executor.submit(run, *task)
-            executor.shutdown(True)
-        except (KeyboardInterrupt, SystemExit):
-            logging.warning("KILLED: shutting down threads...")
-            for mr in mzn_runners:
-                mr.kill = True
-            executor.shutdown(True)
-            logging.warning("KILLED: DONE")
-            exit(1)
+    run_tasks(tasks, orchestrator)
+
+    if race is not None:
+        # the runs of the pruned asset types are left to the remaining
+        # contenders:
+        for target in race.targets()[1:]:
+            race.prune()
+            tasks = order_tasks(race.tasks(target), args.schedule)
+            if args.memory_reserve is not None:
+                learn_footprints(tasks)
+            logging.info(f'Race: {target} runs; {len(tasks)} tasks')
+            run_tasks(tasks, orchestrator)
 
+    if adaptive is not None:
+        # the pairs whose mean objective is not yet precise enough are run
+        # again, until every pair is precise enough or was attempted
+        # --num-runs times, or a round records no run:
+        while True:
+            num_recorded = adaptive.num_recorded()
+            tasks = order_tasks(adaptive.tasks(), args.schedule)
+            if len(tasks) == 0:
+                break
+            if args.memory_reserve is not None:
+                learn_footprints(tasks)
+            logging.info(f'Adaptive runs: {len(tasks)} more tasks')
+            run_tasks(tasks, orchestrator)
+            if adaptive.num_recorded() == num_recorded:
+                logging.warning('Adaptive runs: no runs were recorded; '
+                                'stopping.')
+                break
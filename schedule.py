@@ -0,0 +1,118 @@
+import logging
+from typing import Dict, List, Union
+from os import path
+from statistics import mean, median
+import re
+
+
+# the parameters of the data files that determine the size of an instance;
+# the size is the product of the parameters that are present:
+size_parameters = [
+    'n_jobs',       # job shop
+    'n_machines',   # job shop
+    'Orders',       # steel mill slab design
+    'Locations',    # travelling salesperson with time windows
+    'n',            # travelling salesperson with time windows (original)
+    'Cars',         # car sequencing
+]
+
+int_re = re.compile(r'^\s*(\w+)\s*=\s*(-?\d+)\s*;')
+range_re = re.compile(r'^\s*(\w+)\s*=\s*(-?\d+)\s*\.\.\s*(-?\d+)\s*;')
+
+
+def instance_name(data_file: str) -> str:
+    return path.splitext(path.basename(data_file))[0]
+
+
+def instance_size(data_file: str) -> Union[None, int]:
+    values = dict()
+    with open(data_file, 'r') as dzn:
+        for line in dzn:
+            match = range_re.match(line)
+            if match is not None:
+                first, last = int(match.group(2)), int(match.group(3))
+                values[match.group(1)] = max(0, last - first + 1)
+                continue
+            match = int_re.match(line)
+            if match is not None:
+                values[match.group(1)] = int(match.group(2))
+    sizes = [values[p] for p in size_parameters if p in values]
+    if len(sizes) == 0:
+        return None
+    size = 1
+    for s in sizes:
+        size *= s
+    return size
+
+
+def historical_times(output_paths: List[str],
+                     recorded: Union[None, Dict[str, List[int]]] = None
+                     ) -> Dict[str, float]:
+    # the mean time column of every instance in the given result files and
+    # the recorded times (e.g. of a ResultStore):
+    times: Dict[str, List[int]] = dict()
+    if recorded is not None:
+        for instance, ts in recorded.items():
+            times.setdefault(instance, []).extend(ts)
+    for output_path in output_paths:
+        if not path.isfile(output_path):
+            continue
+        with open(output_path, 'r') as output_file:
+            for line in output_file:
+                entries = line.lstrip().split('\t', 3)
+                if len(entries) < 3:
+                    continue
+                try:
+                    times.setdefault(entries[0], []).append(int(entries[2]))
+                except ValueError:
+                    continue
+    return {i: mean(ts) for i, ts in times.items()}
+
+
+def historical_peak_rss(output_paths: List[str]) -> Dict[str, int]:
+    # the largest maxrss column (in KiB) of every instance in the given result
+    # files:
+    peaks: Dict[str, int] = dict()
+    for output_path in output_paths:
+        if not path.isfile(output_path):
+            continue
+        with open(output_path, 'r') as output_file:
+            for line in output_file:
+                entries = line.strip().split('\t')
+                for entry in entries[6:]:
+                    if not entry.startswith('maxrss='):
+                        continue
+                    try:
+                        maxrss = int(entry[len('maxrss='):])
+                    except ValueError:
+                        continue
+                    peaks[entries[0]] = max(maxrss, peaks.get(entries[0], 0))
+    return peaks
+
+
+def expected_durations(data_files: List[str], output_paths: List[str],
+                       recorded: Union[None, Dict[str, List[int]]] = None
+                       ) -> Dict[str, float]:
+    history = historical_times(output_paths, recorded)
+    sizes = {df: instance_size(df) for df in data_files}
+    # without history, the size is converted to a duration using the median
+    # time per size unit of the instances that have history:
+    ratios = [history[instance_name(df)] / sizes[df] for df in data_files
+              if instance_name(df) in history and
+              sizes[df] is not None and sizes[df] > 0]
+    ratio = median(ratios) if len(ratios) > 0 else 1.0
+    known = [history[instance_name(df)] for df in data_files
+             if instance_name(df) in history]
+    fallback = mean(known) if len(known) > 0 else 0.0
+    durations = dict()
+    for df in data_files:
+        name = instance_name(df)
+        if name in history:
+            durations[df] = history[name]
+        elif sizes[df] is not None:
+            durations[df] = sizes[df] * ratio
+        else:
+            durations[df] = fallback
+    logging.info(f'Expected durations: {len(known)} instances from history, '
+                 f'{len(data_files) - len(known)} from their size')
+    return durations
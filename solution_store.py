@@ -0,0 +1,137 @@
+import logging
+from typing import Tuple, Union
+from argparse import ArgumentParser
+from glob import glob
+from os import fdopen, makedirs, path, replace
+from hashlib import sha256
+from tempfile import mkstemp
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# the solution column of a run holds a reference to the stored solution
+# instead of the solution itself:
+reference_prefix = 'sha256:'
+
+
+def is_reference(solution: str) -> bool:
+    return solution.startswith(reference_prefix)
+
+
+class SolutionStore:
+    store_dir: str = None
+    level: int = 9
+
+    def __init__(self, store_dir: str, level: int = 9):
+        self.store_dir = path.abspath(store_dir)
+        self.level = level
+        makedirs(self.store_dir, exist_ok=True)
+
+    def paths(self, key: str) -> Tuple[str, str]:
+        # (zstd, zlib) paths; solutions are read with either codec, so that a
+        # store written with zstandard installed stays readable without it:
+        directory = path.join(self.store_dir, key[:2])
+        return (path.join(directory, f'{key}.zst'),
+                path.join(directory, f'{key}.z'))
+
+    def compress(self, data: bytes) -> Tuple[bytes, bool]:
+        if zstandard is not None:
+            return zstandard.ZstdCompressor(level=self.level).compress(
+                data), True
+        return zlib.compress(data, self.level), False
+
+    def put(self, solution: str) -> str:
+        if is_reference(solution):
+            return solution
+        data = solution.encode('utf-8')
+        key = sha256(data).hexdigest()
+        zst_path, zlib_path = self.paths(key)
+        # identical solutions (e.g. of repeated runs) are stored once:
+        if path.isfile(zst_path) or path.isfile(zlib_path):
+            return reference_prefix + key
+        compressed, is_zstd = self.compress(data)
+        solution_path = zst_path if is_zstd else zlib_path
+        makedirs(path.dirname(solution_path), exist_ok=True)
+        fd, tmp_path = mkstemp(dir=path.dirname(solution_path),
+                               suffix='.tmp')
+        with fdopen(fd, 'wb') as solution_file:
+            solution_file.write(compressed)
+        replace(tmp_path, solution_path)
+        return reference_prefix + key
+
+    def get(self, reference: str) -> Union[None, str]:
+        if not is_reference(reference):
+            return reference
+        zst_path, zlib_path = self.paths(reference[len(reference_prefix):])
+        if path.isfile(zlib_path):
+            with open(zlib_path, 'rb') as solution_file:
+                return zlib.decompress(solution_file.read()).decode('utf-8')
+        if path.isfile(zst_path):
+            if zstandard is None:
+                raise RuntimeError(f'{zst_path}: reading zstd compressed '
+                                   'solutions requires zstandard.')
+            with open(zst_path, 'rb') as solution_file:
+                return zstandard.ZstdDecompressor().decompress(
+                    solution_file.read()).decode('utf-8')
+        return None
+
+    def compact(self, txt_file: str) -> int:
+        # replaces the solution column of every run in the result file with a
+        # reference; the file is rewritten and then moved over the original,
+        # so it must not be written to by run.py at the same time:
+        num_compacted = 0
+        tmp_path = f'{txt_file}.compact.tmp'
+        with open(txt_file, 'r') as input, open(tmp_path, 'w') as output:
+            for line in input:
+                entries = line.rstrip('\n').split('\t')
+                if (len(entries) > 5 and entries[5].strip() != '--' and
+                        not is_reference(entries[5].strip())):
+                    entries[5] = self.put(entries[5].strip())
+                    num_compacted += 1
+                output.write('\t'.join(entries) + '\n')
+        replace(tmp_path, txt_file)
+        return num_compacted
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+
+    parser.add_argument('--store', dest='store', metavar='<store directory>',
+                        type=str, required=True,
+                        help='the directory of the solution store.')
+
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    compact_parser = subparsers.add_parser(
+        'compact', help='move the solutions of results/<model>.txt-<method> '
+        'files into the store, in place.')
+    compact_parser.add_argument(dest='data_files',
+                                metavar='<data file>.txt[-*]', nargs='+',
+                                type=str, help='txt result files.')
+
+    show_parser = subparsers.add_parser(
+        'show', help='print stored solutions.')
+    show_parser.add_argument(dest='references', metavar='sha256:<hash>',
+                             nargs='+', type=str,
+                             help='solution references.')
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    solution_store = SolutionStore(args.store)
+
+    if args.command == 'compact':
+        data_files = sorted({fp for glob_list in args.data_files
+                             for fp in glob(glob_list)})
+        for data_file in data_files:
+            num_compacted = solution_store.compact(data_file)
+            logging.info(f'{path.basename(data_file)}: compacted '
+                         f'{num_compacted} solutions')
+    elif args.command == 'show':
+        for reference in args.references:
+            print(solution_store.get(reference))
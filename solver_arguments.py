@@ -0,0 +1,30 @@
+from typing import List, Union
+import re
+
+# the objective printed with each solution:
+objective_re = re.compile(r'^\s*objective\s*=\s*(\d+)')
+
+
+def search_limit_flags(node_limit: Union[None, int] = None,
+                       fail_limit: Union[None, int] = None,
+                       seed: Union[None, int] = None) -> List[str]:
+    # the MiniZinc flags that stop Gecode after a number of nodes or failures
+    # and fix its random seed:
+    flags = []
+    if node_limit is not None:
+        flags += ['--node', str(node_limit)]
+    if fail_limit is not None:
+        flags += ['--fail', str(fail_limit)]
+    if seed is not None:
+        flags += ['-r', str(seed)]
+    return flags
+
+
+def minizinc_arguments(minizinc_path: str, model: str, solver: str,
+                       data_file: str, time_limit: Union[None, int] = None,
+                       flags: Union[None, List[str]] = None) -> List[str]:
+    # the MiniZinc command line that flattens and solves the instance:
+    args = [minizinc_path, model, '--solver', solver, '-d', data_file]
+    if time_limit is not None:
+        args += ['--time-limit', str(time_limit)]
+    return args + ([] if flags is None else flags)
@@ -0,0 +1,22 @@
+from os import path
+import sys
+import unittest
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+from dcs import dependecy_curation, read_fzn  # noqa: E402
+
+fzn_dir = path.join(path.dirname(path.abspath(__file__)), 'fzn')
+
+
+class ReadFznTest(unittest.TestCase):
+    def test_alias_of_defined_variable_is_not_a_search_variable(self):
+        # FlatZinc as written by MiniZinc: the output variable w is an alias
+        # of X_INTRODUCED_0_, which int_lin_eq defines:
+        variables, graph = read_fzn(path.join(fzn_dir, 'alias.fzn'))
+        self.assertEqual(variables, {'x', 'y', 'w'})
+        self.assertEqual(dependecy_curation(variables, graph), {'x', 'y'})
+
+
+if __name__ == '__main__':
+    unittest.main()
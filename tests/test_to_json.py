@@ -0,0 +1,38 @@
+from os import makedirs, path
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+from to_json import JsonWriter, trajectory_path  # noqa: E402
+
+
+class ParseFileTest(unittest.TestCase):
+    def test_trajectories_skip_budget_runs_at_time_limit(self):
+        # the second run reached the time limit before it spent its budget
+        # and is left out, but its trajectory line is still in the file:
+        with tempfile.TemporaryDirectory() as results:
+            txt_file = path.join(results, 'jobshop.txt-pg')
+            with open(txt_file, 'w') as f:
+                f.write('i1\t100\t400\tfalse\t120\t[]\tbudget=fail:50\n')
+                f.write('i1\t95\t1000\tfalse\t120\t[]\tbudget=fail:50\t'
+                        'limit=time\n')
+                f.write('i1\t90\t300\tfalse\t120\t[]\tbudget=fail:50\n')
+            makedirs(path.dirname(trajectory_path(txt_file)))
+            with open(trajectory_path(txt_file), 'w') as f:
+                f.write('i1\t10:100\n')
+                f.write('i1\t20:95\n')
+                f.write('i1\t30:90\n')
+            writer = JsonWriter('jobshop', 'JSP', None)
+            writer.parse_file(txt_file)
+        methods = writer.model.instances['i1'].methods
+        self.assertEqual(len(methods), 1)
+        runs = list(methods.values())[0].runs
+        self.assertEqual([r.objective for r in runs], [100, 90])
+        self.assertEqual([r.trajectory for r in runs],
+                         [[(10, 100)], [(30, 90)]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,26 +1,246 @@
 import logging
-from typing import List, Dict, Union
+from typing import List, Dict, Tuple, Union
 from argparse import ArgumentParser, ArgumentTypeError
 from glob import glob
 from os import path
-from statistics import mean
+from statistics import NormalDist, mean, stdev
+from math import pi, sqrt, tan
 import json
 
 
+def trajectory_path(output_path: str) -> str:
+    # the trajectories of results/<model>.txt-<asset> are stored in
+    # results/trajectories/<model>.txt-<asset>:
+    return path.join(path.dirname(output_path), 'trajectories',
+                     path.basename(output_path))
+
+
+def parse_trajectory(entry: str) -> List[Tuple[int, int]]:
+    trajectory = []
+    for point in entry.split():
+        try:
+            ms, obj = point.split(':')
+            trajectory.append((int(ms), int(obj)))
+        except ValueError:
+            continue
+    return trajectory
+
+
+def parse_extras(entries: List[str]) -> Dict[str, str]:
+    # the key=value columns following the solution column:
+    extras = dict()
+    for entry in entries:
+        if '=' in entry:
+            key, value = entry.split('=', 1)
+            extras[key.strip()] = value.strip()
+    return extras
+
+
+# the resource usage of a run (see orchestrator.rusage_dict):
+rusage_keys = ['utime', 'stime', 'maxrss', 'nvcsw', 'nivcsw', 'majflt']
+
+
+def reached_time_limit(extras: Dict[str, str]) -> bool:
+    # a run with a deterministic budget that was stopped by the time limit
+    # before it spent its budget (see run.py --budget) is not deterministic:
+    return 'budget' in extras and extras.get('limit') == 'time'
+
+
+def parse_rusage(extras: Dict[str, str]) -> Union[Dict[str, float], None]:
+    try:
+        return {k: float(extras[k]) for k in rusage_keys}
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+# the search statistics of a run recorded with run.py --statistics; the
+# times are in seconds:
+statistic_keys = ['nodes', 'failures', 'propagations', 'restarts',
+                  'flatTime', 'solveTime']
+
+
+def parse_statistics(extras: Dict[str, str]) -> Union[Dict[str, float],
+                                                      None]:
+    statistics = dict()
+    for k in statistic_keys:
+        try:
+            statistics[k] = float(extras[k])
+        except (KeyError, TypeError, ValueError):
+            continue
+    return statistics if len(statistics) > 0 else None
+
+
 class Run:
     objective: Union[int, None] = None
     time: Union[int, None] = None
     error: bool = None
-
-    def __init__(self, obj: int, time: int, error: bool):
+    # (milliseconds, objective) of every improving solution, if recorded:
+    trajectory: Union[List[Tuple[int, int]], None] = None
+    # user/system cpu seconds, peak rss (KiB), context switches and major
+    # faults of the solver, if recorded:
+    rusage: Union[Dict[str, float], None] = None
+    statistics: Union[Dict[str, float], None] = None
+    # the run ran out of memory:
+    memout: bool = False
+
+    def __init__(self, obj: int, time: int, error: bool,
+                 trajectory: Union[List[Tuple[int, int]], None] = None):
         self.objective = obj
         self.time = time
         self.error = error
+        self.trajectory = trajectory
+
+    def objective_at(self, ms: int) -> Union[int, None]:
+        obj = None
+        for t, o in self.trajectory:
+            if t > ms:
+                break
+            obj = o
+        return obj
+
+    def cpu_utilisation(self) -> Union[float, None]:
+        # well below 1 for a single-threaded solver that lost its core to
+        # other processes:
+        if self.rusage is None or not self.time:
+            return None
+        return ((self.rusage['utime'] + self.rusage['stime']) /
+                (self.time / 1000))
+
+    def throughput(self) -> Union[Dict[str, float], None]:
+        # the flattening and search times (in milliseconds) are reported
+        # separately, so that the search is not charged for MiniZinc's startup
+        # and flattening; the rates are per second of search:
+        if self.statistics is None:
+            return None
+        d = dict(self.statistics)
+        solve_time = self.statistics.get('solveTime')
+        if 'flatTime' in self.statistics:
+            d['flatten_time'] = 1000 * self.statistics['flatTime']
+        if solve_time is not None:
+            d['search_time'] = 1000 * solve_time
+        for k in ('nodes', 'restarts'):
+            if k in self.statistics and solve_time:
+                d[f'{k}_per_second'] = self.statistics[k] / solve_time
+        return d
 
     def to_dict(self):
-        return {'objective': self.objective,
-                'time': self.time,
-                'error': self.error}
+        d = {'objective': self.objective,
+             'time': self.time,
+             'error': self.error}
+        if self.rusage is not None:
+            d['rusage'] = dict(self.rusage,
+                               cpu_utilisation=self.cpu_utilisation())
+        if self.statistics is not None:
+            d['statistics'] = self.throughput()
+        if self.memout:
+            d['memout'] = True
+        return d
+
+
+def mean_throughput(runs: List[Run]) -> Union[Dict[str, float], None]:
+    throughputs = [r.throughput() for r in runs if r.statistics is not None]
+    if len(throughputs) == 0:
+        return None
+    keys = {k for t in throughputs for k in t.keys()}
+    d = {k: mean(t[k] for t in throughputs if k in t) for k in sorted(keys)}
+    d['num_runs'] = len(throughputs)
+    return d
+
+
+class Anytime:
+    checkpoints: List[int] = []
+    target_gap: float = 0.0
+
+    def __init__(self, checkpoints: List[int], target_gap: float):
+        self.checkpoints = list(sorted(checkpoints))
+        self.target_gap = target_gap
+
+    @staticmethod
+    def primal_gap(obj: Union[int, None],
+                   best_objective: Union[int, None]) -> float:
+        if obj is None or best_objective is None:
+            return 1.0
+        if obj == best_objective:
+            return 0.0
+        if obj * best_objective < 0:
+            return 1.0
+        return abs(obj - best_objective) / max(abs(obj), abs(best_objective))
+
+    def primal_integral(self, run: Run, best_objective: int,
+                        horizon: int) -> float:
+        # the primal gap is 1 until the first solution is found:
+        integral = 0.0
+        prev_time, prev_gap = 0, 1.0
+        for t, o in run.trajectory:
+            if t >= horizon:
+                break
+            integral += prev_gap * (t - prev_time)
+            prev_time, prev_gap = t, self.primal_gap(o, best_objective)
+        return integral + prev_gap * max(0, horizon - prev_time)
+
+    def time_to_target(self, run: Run,
+                       best_objective: int) -> Union[int, None]:
+        for t, o in run.trajectory:
+            if self.primal_gap(o, best_objective) <= self.target_gap:
+                return t
+        return None
+
+    def horizon(self, run: Run) -> int:
+        if run.time is not None:
+            return run.time
+        return run.trajectory[-1][0] if len(run.trajectory) > 0 else 0
+
+    def run_dict(self, run: Run, best_objective: int):
+        return {
+            'primal_integral': self.primal_integral(
+                run, best_objective, self.horizon(run)),
+            'time_to_target': self.time_to_target(run, best_objective),
+            'checkpoints': [
+                {'time': c,
+                 'objective': run.objective_at(c),
+                 'primal_integral': self.primal_integral(
+                     run, best_objective, c)}
+                for c in self.checkpoints]}
+
+    def mean_dict(self, runs: List[Run], best_objective: int):
+        run_dicts = [self.run_dict(r, best_objective) for r in runs]
+        reached = [d['time_to_target'] for d in run_dicts
+                   if d['time_to_target'] is not None]
+        checkpoints = []
+        for i, c in enumerate(self.checkpoints):
+            objs = [d['checkpoints'][i]['objective'] for d in run_dicts]
+            checkpoints.append({
+                'time': c,
+                'objective': (None if any(o is None for o in objs)
+                              else mean(objs)),
+                'primal_integral': mean(
+                    d['checkpoints'][i]['primal_integral']
+                    for d in run_dicts)})
+        return {'num_runs': len(run_dicts),
+                'primal_integral': mean(d['primal_integral']
+                                        for d in run_dicts),
+                'time_to_target': mean(reached) if len(reached) > 0 else None,
+                'num_reached_target': len(reached),
+                'target_gap': self.target_gap,
+                'checkpoints': checkpoints}
+
+
+def t_quantile(df: int, confidence: float = 0.95) -> float:
+    # the two-sided critical value of Student's t distribution; exact for one
+    # and two degrees of freedom, and the Cornish-Fisher expansion (accurate
+    # to three decimals) otherwise:
+    p = 1 - (1 - confidence) / 2
+    if df == 1:
+        return tan(pi * (p - 0.5))
+    if df == 2:
+        return (2 * p - 1) / sqrt(2 * p * (1 - p))
+    z = NormalDist().inv_cdf(p)
+    return (z + (z ** 3 + z) / (4 * df) +
+            (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * df ** 2) +
+            (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) /
+            (384 * df ** 3) +
+            (79 * z ** 9 + 776 * z ** 7 + 1482 * z ** 5 - 1920 * z ** 3 -
+             945 * z) / (92160 * df ** 4))
 
 
 class Method:
@@ -33,8 +253,9 @@ class Method:
         self.acronym = acronym
         self.runs = []
 
-    def append_run(self, obj, time, error) -> None:
+    def append_run(self, obj, time, error) -> Run:
         self.runs.append(Run(obj, time, error))
+        return self.runs[-1]
 
     def mean_run(self) -> Run:
         obj = (None if any(r.objective is None for r in self.runs)
@@ -44,12 +265,69 @@ class Method:
         error = any(r.error for r in self.runs)
         return Run(obj, time, error)
 
-    def to_dict(self, all_runs: bool = False):
+    def confidence_interval(self, confidence: float = 0.95
+                            ) -> Union[None, Tuple[float, float]]:
+        # the confidence interval of the mean objective of mean_run:
+        if (len(self.runs) < 2 or
+                any(r.objective is None for r in self.runs)):
+            return None
+        objectives = [r.objective for r in self.runs]
+        half_width = (t_quantile(len(objectives) - 1, confidence) *
+                      stdev(objectives) / sqrt(len(objectives)))
+        return (mean(objectives) - half_width,
+                mean(objectives) + half_width)
+
+    def relative_width(self, confidence: float = 0.95) -> Union[None, float]:
+        # the width of the confidence interval relative to the mean objective:
+        interval = self.confidence_interval(confidence)
+        if interval is None:
+            return None
+        center = abs(interval[0] + interval[1]) / 2
+        width = interval[1] - interval[0]
+        if center == 0:
+            return 0.0 if width == 0 else None
+        return width / center
+
+    def mean_rusage(self) -> Union[Dict[str, float], None]:
+        runs = [r for r in self.runs if r.rusage is not None]
+        if len(runs) == 0:
+            return None
+        d = {k: mean(r.rusage[k] for r in runs) for k in rusage_keys}
+        d['max_maxrss'] = max(r.rusage['maxrss'] for r in runs)
+        utilisations = [r.cpu_utilisation() for r in runs
+                        if r.cpu_utilisation() is not None]
+        d['cpu_utilisation'] = (mean(utilisations) if len(utilisations) > 0
+                                else None)
+        d['num_runs'] = len(runs)
+        return d
+
+    def to_dict(self, all_runs: bool = False,
+                anytime: Union[Anytime, None] = None,
+                best_objective: Union[int, None] = None):
         d = {'name': self.name,
              'acronym': self.acronym,
              'mean': self.mean_run().to_dict()}
+        interval = self.confidence_interval()
+        if interval is not None:
+            d['confidence_interval'] = list(interval)
+        num_memouts = sum(1 for r in self.runs if r.memout)
+        if num_memouts > 0:
+            d['num_memouts'] = num_memouts
+        rusage = self.mean_rusage()
+        if rusage is not None:
+            d['rusage'] = rusage
+        statistics = mean_throughput(self.runs)
+        if statistics is not None:
+            d['statistics'] = statistics
+        traced = [r for r in self.runs if r.trajectory is not None]
+        if anytime is not None and len(traced) > 0:
+            d['anytime'] = anytime.mean_dict(traced, best_objective)
         if all_runs:
             d['runs'] = [r.to_dict() for r in self.runs]
+            if anytime is not None:
+                for r, rd in zip(self.runs, d['runs']):
+                    if r.trajectory is not None:
+                        rd['anytime'] = anytime.run_dict(r, best_objective)
         return d
 
 
@@ -57,21 +335,27 @@ class Instance:
     name: str = None
     initial_objective: int = None
     best_objective: int = None
+    # the best known objective and bound of a registry (best_known.py):
+    best_known: Union[None, int] = None
+    bound: Union[None, int] = None
     methods = Dict[str, Method]
 
     def __init__(self, name, initial_objective):
         self.name = name
         self.initial_objective = initial_objective
         self.best_objective = initial_objective
+        self.best_known = None
+        self.bound = None
         self.methods = {}
 
     def add_method(self, method_name: str, acronym: str, obj: int, time: int,
-                   error: bool) -> None:
+                   error: bool) -> Run:
         if method_name not in self.methods:
             self.methods[method_name] = Method(method_name, acronym)
-        self.methods[method_name].append_run(obj, time, error)
+        run = self.methods[method_name].append_run(obj, time, error)
         if obj is not None:
             self.update_best(obj)
+        return run
 
     def update_best(self, best_objective):
         if best_objective is None:
@@ -83,12 +367,26 @@ class Instance:
         elif best_objective < self.initial_objective:
             self.best_objective = min(best_objective, self.best_objective)
 
-    def to_dict(self, all_runs: bool = False):
-        return {'name': self.name,
-                'initial_objective': self.initial_objective,
-                'best_objective': self.best_objective,
-                'methods': [instance.to_dict(all_runs) for
-                            instance in self.methods.values()]}
+    def to_dict(self, all_runs: bool = False,
+                anytime: Union[Anytime, None] = None):
+        d = {'name': self.name,
+             'initial_objective': self.initial_objective,
+             'best_objective': self.best_objective,
+             'methods': [instance.to_dict(all_runs, anytime,
+                                          self.best_objective) for
+                         instance in self.methods.values()]}
+        if self.best_known is not None or self.bound is not None:
+            # the gaps of the mean objective of each method to the best
+            # objective (including the best known) and to the bound:
+            d['best_known'] = self.best_known
+            d['bound'] = self.bound
+            for method, md in zip(self.methods.values(), d['methods']):
+                objective = method.mean_run().objective
+                md['gap'] = Anytime.primal_gap(objective, self.best_objective)
+                if self.bound is not None:
+                    md['bound_gap'] = Anytime.primal_gap(objective,
+                                                         self.bound)
+        return d
 
 
 class Model:
@@ -113,53 +411,123 @@ class Model:
         for instance in self.instances.values():
           instance.update_best(best_objective)
 
-    def to_dict(self, all_runs: bool = False):
-        return {
+    def statistics(self) -> Dict[str, Dict[str, float]]:
+        # the throughput of each method (LNS asset type) over all instances:
+        runs: Dict[str, List[Run]] = dict()
+        for instance in self.instances.values():
+            for method in instance.methods.values():
+                runs.setdefault(method.name, []).extend(method.runs)
+        statistics = dict()
+        for method_name, method_runs in runs.items():
+            throughput = mean_throughput(method_runs)
+            if throughput is not None:
+                statistics[method_name] = throughput
+        return statistics
+
+    def to_dict(self, all_runs: bool = False,
+                anytime: Union[Anytime, None] = None):
+        d = {
             'model': self.name,
             'acronym': self.acronym,
-            'instances': [instance.to_dict(all_runs) for
+            'instances': [instance.to_dict(all_runs, anytime) for
                           instance in self.instances.values()]}
+        statistics = self.statistics()
+        if len(statistics) > 0:
+            d['statistics'] = statistics
+        return d
 
 
 class JsonWriter:
     model: Model = None
     best_objective: Union[None, int] = None
+    anytime: Union[None, Anytime] = None
+    # a best_known.Registry of per-instance best known objectives and bounds:
+    best_known = None
     name_dict = {'random': 'Randomised LNS',
                  'pg': 'Propagation guided LNS',
                  'ci': 'Cost impact guided LNS',
                  'or': 'OR-LNS',
                  'vrg': 'Variable-relationship guided LNS',
                  'svd': 'Variable-relationship guided LNS',
-                 'rpg': 'Reverse propagation guided LNS'}
+                 'rpg': 'Reverse propagation guided LNS',
+                 'portfolio': 'LNS portfolio'}
     acronym_dict = {'random': 'Randomised LNS',
                     'pg': 'PG-LNS',
                     'ci': 'CIG-LNS',
                     'or': 'OR-LNS',
                     'vrg': 'VRG-LNS',
                     'svd': 'VRG-LNS',
-                    'rpg': 'RPG-LNS'}
+                    'rpg': 'RPG-LNS',
+                    'portfolio': 'Portfolio-LNS'}
 
-    def __init__(self, model_name, acronym, best_objective):
+    def __init__(self, model_name, acronym, best_objective,
+                 anytime: Union[None, Anytime] = None, best_known=None):
         self.model = Model(model_name, acronym)
         self.best_objective = best_objective
+        self.anytime = anytime
+        self.best_known = best_known
         logging.info(model_name)
         logging.info(acronym)
 
-    def parse_file(self, txt_file) -> None:
-        fname, ext = path.splitext(path.basename(txt_file))
-        method_name = ext.lstrip('.').lstrip('txt').lstrip('-')
+    def method_name(self, fname: str,
+                    method_name: str) -> Tuple[str, Union[None, str]]:
         acronym = self.acronym_dict.get(method_name)
         method_name = self.name_dict.get(method_name, method_name)
 
         if fname.lower().endswith('-cc'):
             method_name = f'cc-{method_name}'
+        return method_name, acronym
+
+    @staticmethod
+    def budget_method(method_name: str, acronym: Union[None, str],
+                      extras: Dict[str, str]) -> Tuple[str, Union[None, str]]:
+        # runs with a deterministic budget (run.py --budget) are not
+        # comparable to runs with a time limit, so each budget kind is a
+        # method of its own:
+        if 'budget' not in extras:
+            return method_name, acronym
+        kind = extras['budget'].split(':')[0]
+        return (f'{method_name} ({kind} budget)',
+                None if acronym is None else f'{acronym}-{kind}')
+
+    def add_run(self, i_name: str, initial_obj: Union[None, int],
+                method_name: str, acronym: Union[None, str],
+                r_obj: Union[None, int], r_time: Union[None, int],
+                r_error: bool) -> Run:
+        run = self.model.add_instance(i_name, initial_obj).add_method(
+            method_name, acronym, r_obj, r_time, r_error)
+        instance = self.model.instances[i_name]
+        instance.update_best(self.best_objective)
+        entry = (None if self.best_known is None
+                 else self.best_known.get(i_name))
+        if entry is not None:
+            instance.best_known = entry.objective
+            instance.bound = entry.bound
+            instance.update_best(entry.objective)
+        return run
+
+    def parse_file(self, txt_file) -> None:
+        fname, ext = path.splitext(path.basename(txt_file))
+        method_name, acronym = self.method_name(
+            fname, ext.lstrip('.').lstrip('txt').lstrip('-'))
+
+        # instance -> its runs in the order of their lines; a skipped run is
+        # None, so that the k-th trajectory still belongs to the k-th line:
+        runs: Dict[str, List[Union[None, Run]]] = dict()
 
         with open(txt_file, 'r') as input:
-            for line in input.readlines():
-                entries = [e.strip() for e in line.split('\t')]
+            for line in input:
+                # the solution column (the sixth) is not parsed:
+                columns = line.split('\t', 5)
+                entries = [e.strip() for e in columns[:5]]
+                extras = (parse_extras(columns[5].split('\t')[1:])
+                          if len(columns) > 5 else dict())
                 if len(entries) < 4:
                     continue
                 i_name = entries[0]
+                if reached_time_limit(extras):
+                    runs.setdefault(i_name, []).append(None)
+                    continue
                 try:
                     r_obj = int(entries[1])
                 except ValueError:
@@ -174,14 +542,65 @@ class JsonWriter:
                 except ValueError:
                     initial_obj = None
 
-                self.model.add_instance(i_name, initial_obj).add_method(
-                    method_name, acronym, r_obj, r_time, r_error)
-                self.model.instances[i_name].update_best(self.best_objective)
+                run = self.add_run(i_name, initial_obj,
+                                   *self.budget_method(method_name, acronym,
+                                                       extras),
+                                   r_obj, r_time, r_error)
+                run.rusage = parse_rusage(extras)
+                run.statistics = parse_statistics(extras)
+                run.memout = extras.get('memout') == 'true'
+                runs.setdefault(i_name, []).append(run)
+
+        self.parse_trajectories(trajectory_path(txt_file), runs)
 
-    def write_json(self, json_path, all_runs: bool = False):
-        d = self.model.to_dict(all_runs)
+    def parse_trajectories(self, trajectory_file: str,
+                           runs: Dict[str, List[Union[None, Run]]]) -> None:
+        if not path.isfile(trajectory_file):
+            return
+        trajectories: Dict[str, List[List[Tuple[int, int]]]] = dict()
+        with open(trajectory_file, 'r') as input:
+            for line in input.readlines():
+                entries = [e.strip() for e in line.split('\t')]
+                if len(entries) < 2:
+                    continue
+                trajectories.setdefault(entries[0], []).append(
+                    parse_trajectory(entries[1]))
+        # trajectories may only have been recorded for the most recent runs
+        # of an instance, so they are matched from the end:
+        for i_name, i_trajectories in trajectories.items():
+            for run, trajectory in zip(reversed(runs.get(i_name, [])),
+                                       reversed(i_trajectories)):
+                if run is not None:
+                    run.trajectory = trajectory
+
+    def parse_store(self, store, model_name: str) -> None:
+        # the runs of one model (results/<model>.txt-*) in a ResultStore; the
+        # solutions are not read:
+        trajectories = store.trajectories(model_name)
+        for (run_id, method, i_name, r_obj, r_time, r_error, initial_obj,
+             extras) in store.runs(model_name):
+            extras = dict() if extras is None else json.loads(extras)
+            if reached_time_limit(extras):
+                continue
+            method_name, acronym = self.budget_method(
+                *self.method_name(model_name, method), extras)
+            run = self.add_run(i_name, initial_obj, method_name, acronym,
+                               r_obj, r_time, bool(r_error))
+            run.trajectory = trajectories.get(run_id)
+            if len(extras) > 0:
+                run.rusage = parse_rusage(extras)
+                run.statistics = parse_statistics(extras)
+                run.memout = extras.get('memout') == 'true'
+
+    def write_json(self, json_path, all_runs: bool = False,
+                   store=None):
+        d = self.model.to_dict(all_runs, self.anytime)
         with open(json_path, 'w+') as json_file:
             json.dump(d, json_file)
+        if store is not None:
+            # compare.py can read the aggregate from the store:
+            store.put_aggregate(
+                path.splitext(path.basename(json_path))[0], d)
 
 
 if __name__ == '__main__':
@@ -224,6 +643,18 @@ if __name__ == '__main__':
                             metavar='<data file>.txt[-*]', nargs='*',
                             type=str, help='txt input files.')
 
+    data_group.add_argument('--db', dest='db', metavar='<results>.sqlite',
+                            type=str, default=None,
+                            help='read the runs from this SQLite result '
+                            'store instead of txt files; the JSON is also '
+                            'stored in it for compare.py.')
+
+    parser.add_argument('--db-models', dest='db_models', nargs='*',
+                        type=str, default=None, metavar='<model pattern>',
+                        help='the models (results/<model>.txt-* file names '
+                        'without extension, e.g. jobshop*) to read from the '
+                        'result store; defaults to all.')
+
     parser.add_argument('-o', '--output', dest='output',
                         metavar='<output file>', type=creatable_file,
                         help='the output json file.')
@@ -236,10 +667,46 @@ if __name__ == '__main__':
                         type=int, default=None,
                         help='The best known objective value.')
 
+    parser.add_argument('--best-known', dest='best_known',
+                        metavar='<registry>.json', type=str, default=None,
+                        help='the registry of per-instance best known '
+                        'objectives and bounds (see best_known.py) that the '
+                        'gaps of each method are computed against.')
+
+    parser.add_argument('--checkpoints', dest='checkpoints', nargs='*',
+                        type=int, default=[],
+                        metavar='<milliseconds>',
+                        help='the times (in milliseconds) at which the '
+                        'objective and primal integral of runs with a '
+                        'recorded trajectory are reported.')
+
+    parser.add_argument('--target-gap', dest='target_gap', type=float,
+                        default=0.0,
+                        help='the primal gap to the best objective that '
+                        'counts as reaching the target for the time to '
+                        'target.')
+
     args = parser.parse_args()
 
     logging.basicConfig(level=logging.INFO)
 
+    best_known = None
+    if args.best_known is not None:
+        from best_known import Registry
+        best_known = Registry(args.best_known)
+
+    json_writer = JsonWriter(args.model, args.acronym, args.best_objective,
+                             Anytime(args.checkpoints, args.target_gap),
+                             best_known)
+
+    if args.db is not None:
+        from result_store import ResultStore
+        store = ResultStore(args.db)
+        for model_name in store.models(args.db_models):
+            json_writer.parse_store(store, model_name)
+        json_writer.write_json(args.output, args.all_runs, store)
+        exit(0)
+
     if args.data_files is None:
         exit(1)
 
@@ -253,8 +720,6 @@ if __name__ == '__main__':
         seen_data_files.add(data_file)
     data_files = list(sorted(data_files))
 
-    json_writer = JsonWriter(args.model, args.acronym, args.best_objective)
-
     for df in data_files:
         json_writer.parse_file(df)
 